@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import platform
+import tempfile
+import threading
+import urllib.request
+import numpy as np
+import cv2
+import control
+from control import (state, TickScheduler, EventRecording, DefaultSettings, compile_button_map, InputSnapshot, TouchSnapshot,
+                     InputLog, Timeline,
+                     get_packet_data, get_release_packet, save_events, load_events)
+
+import vision
+import rigs
+
+RESOLUTIONS = {"1080p": (1920, 1080), "1440p": (2560, 1440), "4k": (3840, 2160)}
+# ROIs as fractions of the frame, roughly where a 3DS sits in front of a webcam
+TOP_ROI = [(0.30, 0.12), (0.70, 0.13), (0.69, 0.47), (0.31, 0.46)]
+BOTTOM_ROI = [(0.35, 0.52), (0.66, 0.52), (0.65, 0.86), (0.36, 0.85)]
+
+def summarize(samples_ns, total_s):
+    s = np.sort(np.asarray(samples_ns, dtype=np.float64)) / 1e3
+    return {
+        "calls": len(s),
+        "per_sec": round(len(s) / total_s, 1) if total_s else 0.0,
+        "mean_us": round(float(s.mean()), 2),
+        "p50_us": round(float(np.percentile(s, 50)), 2),
+        "p99_us": round(float(np.percentile(s, 99)), 2),
+        "max_us": round(float(s[-1]), 2),
+    }
+
+def measure(fn, calls, warmup=10):
+    for _ in range(warmup): fn()
+    samples = [0] * calls
+    t0 = time.perf_counter()
+    for i in range(calls):
+        a = time.perf_counter_ns(); fn(); samples[i] = time.perf_counter_ns() - a
+    return summarize(samples, time.perf_counter() - t0)
+
+def synthetic_frame(size):
+    w, h = size
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 40, (h, w, 3), dtype=np.uint8)
+    for roi in (TOP_ROI, BOTTOM_ROI):
+        pts = (np.array(roi) * (w, h)).astype(np.int32)
+        cv2.fillConvexPoly(frame, pts, (200, 220, 230))
+    return frame
+
+def synthetic_screens(size):
+    w, h = size
+    return [np.array(roi, dtype=np.float32) * np.float32((w, h)) for roi in (TOP_ROI, BOTTOM_ROI)]
+
+def bench_packet(quick):
+    state.button_map = compile_button_map(DefaultSettings())
+    rng = random.Random(0)
+    inputs = [(InputSnapshot(rng.getrandbits(18), 0, rng.uniform(-1, 1), 0.0, rng.uniform(-1, 1), 0.0),
+               TouchSnapshot(rng.random() < 0.3, (160, 120))) for _ in range(256)]
+    it = itertools.count()
+
+    def encode():
+        state.pad, state.touch = inputs[next(it) & 255]
+        get_packet_data()
+    return [{"name": "get_packet_data", **measure(encode, 20000 if quick else 200000)}]
+
+def bench_warp(quick, resolutions):
+    results = []
+    for label in resolutions:
+        size = RESOLUTIONS[label]
+        frame = synthetic_frame(size)
+        engine = vision.WarpEngine()
+        t0 = time.perf_counter(); engine.set_screens(synthetic_screens(size)); build = time.perf_counter() - t0
+        r = measure(lambda: engine.warp(frame), 50 if quick else 300)
+        results.append({"name": "warp_to_target", "resolution": label, "map_build_ms": round(build * 1e3, 2), **r})
+    return results
+
+def bench_filters(quick, resolutions):
+    results = []
+    for label in resolutions:
+        size = RESOLUTIONS[label]
+        frame = synthetic_frame(size)
+        engine = vision.WarpEngine()
+        for n in vision.SUPERSAMPLE_FACTORS:
+            engine.set_supersample(n); engine.set_screens(synthetic_screens(size))
+            results.append({"name": "supersample_warp", "resolution": label, "factor": n,
+                            **measure(lambda: engine.warp(frame), 50 if quick else 300)})
+    engine = vision.WarpEngine(); engine.set_screens(synthetic_screens(RESOLUTIONS["1080p"]))
+    warped = [w.copy() for w in engine.warp(synthetic_frame(RESOLUTIONS["1080p"]))]
+    denoiser = vision.TemporalDenoiser()
+    results.append({"name": "temporal_denoise", **measure(lambda: denoiser.apply(warped), 200 if quick else 2000)})
+    return results
+
+def bench_handoff(quick, resolutions):
+    results = []
+    for label in resolutions:
+        source = synthetic_frame(RESOLUTIONS[label])
+        ring = vision.FrameRing()
+        frames = 100 if quick else 600
+        done = threading.Event()
+
+        def producer():
+            for _ in range(frames):
+                idx = ring.acquire()
+                if idx is None: time.sleep(0.0005); continue
+                slot = ring.slots[idx]
+                # Stands in for cap.read(image=slot) decoding into the preallocated slot
+                if slot is None: slot = source.copy()
+                else: np.copyto(slot, source)
+                ring.publish(idx, slot)
+                time.sleep(0.001)
+            done.set()
+
+        latencies, seq, consumed = [], 0, 0
+        t0 = time.perf_counter()
+        threading.Thread(target=producer, daemon=True).start()
+        while not (done.is_set() and not ring.has_newer(seq)):
+            borrowed = ring.wait(seq, timeout=0.05)
+            if borrowed is None: continue
+            idx, seq, frame, stamp = borrowed
+            latencies.append(int((time.perf_counter() - stamp) * 1e9))
+            ring.release(idx)
+            consumed += 1
+        total = time.perf_counter() - t0
+        r = summarize(latencies, total)
+        results.append({"name": "frame_handoff", "resolution": label, "published": ring.seq,
+                        "consumed": consumed, **r})
+    return results
+
+def read_mjpeg(url, seconds, delay, counts, newest=None):
+    # Minimal MJPEG client: counts whole JPEG parts; delay simulates a slow viewer. With newest(), also tracks how many
+    # frames behind the stream each received part already was (frames stuck in socket buffers)
+    frames, behind, end = 0, [], time.perf_counter() + seconds
+    with urllib.request.urlopen(url, timeout=5) as r:
+        while time.perf_counter() < end:
+            line = r.readline()
+            if not line: break
+            if line.lower().startswith(b"content-length"): length = int(line.split(b":")[1])
+            elif line.lower().startswith(b"x-frame"):
+                if newest: behind.append(newest() - int(line.split(b":")[1]))
+                r.readline(); r.read(length); frames += 1
+                if delay: time.sleep(delay)
+    result = {"delay_ms": delay * 1e3, "frames": frames, "fps": round(frames / seconds, 1)}
+    if behind: result.update(behind_mean=round(sum(behind) / len(behind), 1), behind_max=max(behind))
+    counts.append(result)
+
+def bench_stream(quick):
+    # Everything on localhost: the streamer, a 60 fps producer and a mix of fast and slow viewers
+    streamer = vision.ScreenStreamer(host="127.0.0.1", port=0)
+    engine = vision.WarpEngine(); engine.set_screens(synthetic_screens(RESOLUTIONS["1080p"]))
+    warped = [w.copy() for w in engine.warp(synthetic_frame(RESOLUTIONS["1080p"]))]
+    seconds = 1.0 if quick else 5.0
+    stop = threading.Event()
+
+    def produce():
+        while not stop.is_set():
+            streamer.submit(warped); time.sleep(1 / 60)
+    threading.Thread(target=produce, daemon=True).start()
+    clients = []
+    url = f"http://127.0.0.1:{streamer.port}/stream"
+    threads = [threading.Thread(target=read_mjpeg, args=(url, seconds, d, clients, lambda: streamer.broadcast.seq)) for d in (0, 0, 0, 0.1)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    stop.set()
+    encode = measure(lambda: cv2.imencode(".jpg", streamer.free[0] if streamer.free else warped[0], streamer.params), 50)
+    stats = streamer.stats()
+    streamer.close()
+    return [{"name": "mjpeg_stream", "seconds": seconds, **stats, "viewers": clients},
+            {"name": "jpeg_encode", **encode}]
+
+def bench_events(quick):
+    frames = 20 * 60 * (5 if quick else 60) # 5 minutes or an hour at 20 Hz
+    rng = random.Random(0)
+    rec = EventRecording()
+    packets = [get_release_packet()] + [os.urandom(20) for _ in range(31)]
+    held = 0
+    for _ in range(frames):
+        # Held inputs: the same packet for a while, then a change
+        if held == 0: packet, held = rng.choice(packets), rng.randint(1, 40)
+        rec.append(packet); held -= 1
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rle in (False, True):
+            path = os.path.join(tmp, f"bench_{rle}.bin")
+            t0 = time.perf_counter(); save_events(path, rec, rle=rle); save = time.perf_counter() - t0
+            t0 = time.perf_counter(); events = load_events(path); load = time.perf_counter() - t0
+            t0 = time.perf_counter(); n = sum(1 for _ in events.frames()); replay = time.perf_counter() - t0
+            results.append({"name": "event_file", "rle": rle, "frames": n, "bytes": os.path.getsize(path),
+                            "save_ms": round(save * 1e3, 2), "load_ms": round(load * 1e3, 3),
+                            "iterate_ns_per_frame": round(replay * 1e9 / max(n, 1), 1)})
+            del events
+
+    # Full-resolution input log: ~30 changes per second for the same span, edited then rendered at every tick rate
+    n = frames // 20 * 30
+    times = np.sort(np.random.default_rng(0).integers(0, frames * 50_000, n)).astype('<i8')
+    log = InputLog(times, np.frombuffer(b"".join(packets), dtype=np.uint8).reshape(-1, 20)[np.arange(n) % len(packets)])
+    t0 = time.perf_counter()
+    timeline = Timeline.from_log(log)
+    for k in range(100): timeline = timeline.loop(k * 10e6, k * 10e6 + 1e6, 2).stretch(k * 7e6, k * 7e6 + 2e6, 1.5)
+    edit = time.perf_counter() - t0
+    for hz in control.TICK_RATES_HZ:
+        t0 = time.perf_counter(); rendered = timeline.render(1.0 / hz); render = time.perf_counter() - t0
+        results.append({"name": "input_log_render", "events": n, "edits": 200, "segments": len(timeline.segments),
+                        "rate_hz": hz, "frames": len(rendered), "edit_ms": round(edit * 1e3, 2), "render_ms": round(render * 1e3, 2)})
+    return results
+
+def bench_rigs(quick):
+    # N rigs on the same synthetic 1080p clip, each decoding and warping in its own process; shows how total fps holds up as rigs are added
+    seconds, warmup = (2.0, 1.5) if quick else (6.0, 3.0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "clip.mp4")
+        writer = cv2.VideoWriter(clip, cv2.VideoWriter_fourcc(*"mp4v"), 60, RESOLUTIONS["1080p"])
+        frame = synthetic_frame(RESOLUTIONS["1080p"])
+        for _ in range(30): writer.write(frame)
+        writer.release()
+        screens = [s.tolist() for s in synthetic_screens(RESOLUTIONS["1080p"])]
+        cores = os.cpu_count() or 1
+        for n in [n for n in (1, 2, 4, 8) if n <= max(2, cores)]:
+            supervisor = rigs.RigSupervisor([{"name": f"rig{i}", "camera": clip, "screens": screens} for i in range(n)])
+            time.sleep(warmup)
+            before, t0 = supervisor.poll(), time.perf_counter()
+            time.sleep(seconds)
+            after, elapsed = supervisor.poll(), time.perf_counter() - t0
+            supervisor.close()
+            frames = [b["frames"] - a["frames"] for a, b in zip(before["rigs"], after["rigs"])]
+            results.append({"name": "rigs", "rigs": n, "cores": cores, "seconds": round(elapsed, 2),
+                            "total_fps": round(sum(frames) / elapsed, 1), "per_rig_fps": [round(f / elapsed, 1) for f in frames],
+                            "latency_ms": [r["latency_ms"] for r in after["rigs"]], "proc_ms": [r["proc_ms"] for r in after["rigs"]], "status": [r["status"] for r in after["rigs"]]})
+    return results
+
+def bench_heartbeat(quick):
+    results = []
+    for hz in control.TICK_RATES_HZ:
+        scheduler = TickScheduler(1.0 / hz)
+        end = time.perf_counter() + (0.5 if quick else 3.0)
+        while time.perf_counter() < end: scheduler.wait()
+        results.append({"name": "heartbeat", **scheduler.stats()})
+    return results
+
+BENCHES = {
+    "packet": lambda a: bench_packet(a.quick),
+    "warp": lambda a: bench_warp(a.quick, a.resolutions),
+    "filters": lambda a: bench_filters(a.quick, a.resolutions),
+    "handoff": lambda a: bench_handoff(a.quick, a.resolutions),
+    "events": lambda a: bench_events(a.quick),
+    "stream": lambda a: bench_stream(a.quick),
+    "rigs": lambda a: bench_rigs(a.quick),
+    "heartbeat": lambda a: bench_heartbeat(a.quick),
+}
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="3DSC2 hot-path benchmarks (no camera needed)")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHES), default=list(BENCHES))
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for smoke runs")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"machine": machine_info(), "results": []}
+    for name in args.only:
+        print(f"running {name}...", file=sys.stderr)
+        report["results"] += BENCHES[name](args)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1065 @@
+import os
+import sys
+import math
+import struct
+import socket
+import time
+import json
+import threading
+import heapq
+import itertools
+import mmap
+import argparse
+from array import array
+from collections import namedtuple, deque
+
+# Constants
+CPAD_BOUND = 0x5d0
+CPP_BOUND = 0x7f
+TOUCH_SCREEN_WIDTH = 320
+TOUCH_SCREEN_HEIGHT = 240
+TICK_RATE = 0.050 # 50ms = 20Hz
+INPUT_REDIRECTION_PORT = 4950
+PACKET_SIZE = 20
+TICK_RATES_HZ = (20, 30, 60, 120)
+SPIN_WINDOW = 0.001 # sleep until this close to the deadline, then spin
+LATENESS_BINS_US = (50, 100, 250, 500, 1000, 2000, 5000)
+KEEPALIVE_INTERVAL = 0.25 # resend the unchanged state this often while idle
+MIN_SEND_INTERVAL = 0.004 # burst cap: at most one packet per 4ms when input changes quickly
+LATENCY_STAGES = ("poll", "queue", "encode", "send", "total")
+LATENCY_WINDOW = 2000 # samples kept per stage for percentiles
+TRACE_LIMIT = 200000 # stage spans kept for the Chrome trace dump
+EVENT_MAGIC = b"3DSE"
+EVENT_VERSION = 1
+EVENT_RLE = 1 # flag: records are (u32 repeat count, packet) runs
+EVENT_HEADER = struct.Struct('<4sHHIIII') # magic, version, flags, tick_us, frames, records, metadata length
+EVENT_RUN = struct.Struct('<I')
+RENDER_MAX_PUSH = 2 # ticks a button change may be delayed to keep a short tap visible; beyond that changes collapse
+LOG_MAGIC = b"3DSL"
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct('<4sHHQI') # magic, version, flags, events, metadata length; then i64 times (us), then packets
+
+class GamepadButtons:
+    ButtonA = 0
+    ButtonB = 1
+    ButtonX = 2
+    ButtonY = 3
+    ButtonL1 = 4
+    ButtonR1 = 5
+    ButtonL2 = 6
+    ButtonR2 = 7
+    ButtonSelect = 8
+    ButtonStart = 9
+    ButtonL3 = 10
+    ButtonR3 = 11
+    ButtonUp = 12
+    ButtonDown = 13
+    ButtonLeft = 14
+    ButtonRight = 15
+    ButtonCenter = 16
+    ButtonGuide = 17
+    ButtonInvalid = -1
+
+class TickScheduler:
+    def __init__(self, period=TICK_RATE, spin=SPIN_WINDOW):
+        self.period = period
+        self.spin = spin
+        self.next_tick = None
+        self.reset_stats()
+
+    def set_period(self, period):
+        self.period = period
+        self.restart()
+
+    def restart(self):
+        self.next_tick = None
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.missed = 0
+        self.lateness_sum = 0.0
+        self.lateness_max = 0.0
+        self.histogram = [0] * (len(LATENESS_BINS_US) + 1)
+
+    def wait(self):
+        now = time.perf_counter()
+        if self.next_tick is None: self.next_tick = now
+        deadline = self.next_tick
+        if deadline - now > self.spin: time.sleep(deadline - now - self.spin)
+        while True:
+            now = time.perf_counter()
+            if now >= deadline: break
+
+        lateness = now - deadline
+        self.ticks += 1
+        self.lateness_sum += lateness
+        self.lateness_max = max(self.lateness_max, lateness)
+        us = lateness * 1e6
+        b = 0
+        while b < len(LATENESS_BINS_US) and us >= LATENESS_BINS_US[b]: b += 1
+        self.histogram[b] += 1
+
+        self.next_tick = deadline + self.period
+        if now >= self.next_tick:
+            # Fell a whole period or more behind: skip those ticks but keep the phase and count them
+            behind = int((now - self.next_tick) // self.period) + 1
+            self.missed += behind
+            self.next_tick += behind * self.period
+
+    def stats(self):
+        labels = [f"<{b}us" for b in LATENESS_BINS_US] + [f">={LATENESS_BINS_US[-1]}us"]
+        return {
+            "rate_hz": round(1.0 / self.period, 3),
+            "ticks": self.ticks,
+            "missed": self.missed,
+            "lateness_mean_us": round(1e6 * self.lateness_sum / self.ticks, 1) if self.ticks else 0.0,
+            "lateness_max_us": round(1e6 * self.lateness_max, 1),
+            "lateness_histogram": dict(zip(labels, self.histogram)),
+        }
+
+class LatencyTracer:
+    # Follows each input change from the moment it is observed until the packet carrying it is sent
+    def __init__(self, window=LATENCY_WINDOW, trace_limit=TRACE_LIMIT):
+        self.enabled = False
+        self.pending = deque()
+        self.samples = {stage: deque(maxlen=window) for stage in LATENCY_STAGES}
+        self.trace = deque(maxlen=trace_limit)
+
+    def clear(self):
+        self.pending.clear()
+        self.trace.clear()
+        for samples in self.samples.values(): samples.clear()
+
+    def mark(self, source, t_input, t_state=None):
+        # t_input is the earliest the change can have happened (e.g. the previous poll), t_state when state took it
+        if self.enabled: self.pending.append((source, t_input, time.perf_counter() if t_state is None else t_state))
+
+    def sent(self, t_encode, t_encoded, t_sent):
+        # Every input observed before this tick's encode rode on this packet
+        while self.pending and self.pending[0][2] <= t_encode:
+            source, t_input, t_state = self.pending.popleft()
+            for stage, a, b in (("poll", t_input, t_state), ("queue", t_state, t_encode),
+                                ("encode", t_encode, t_encoded), ("send", t_encoded, t_sent)):
+                self.samples[stage].append(b - a)
+                self.trace.append((source, stage, a, b))
+            self.samples["total"].append(t_sent - t_input)
+
+    def discard(self, t_encode):
+        # Inputs observed before an encode that left the packet unchanged never get a send of their own
+        while self.pending and self.pending[0][2] <= t_encode: self.pending.popleft()
+
+    def percentiles(self):
+        result = {}
+        for stage, samples in self.samples.items():
+            s = sorted(samples)
+            if not s: continue
+            pick = lambda q: round(1e3 * s[min(len(s) - 1, int(q * len(s)))], 3)
+            result[stage] = {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(1e3 * s[-1], 3)}
+        return result
+
+    def dump_trace(self, path):
+        spans = list(self.trace)
+        t0 = min((a for _, _, a, _ in spans), default=0.0)
+        events = [{"name": stage, "cat": source, "ph": "X", "pid": 1, "tid": source,
+                   "ts": round((a - t0) * 1e6, 1), "dur": round((b - a) * 1e6, 1)} for source, stage, a, b in spans]
+        with open(path, 'w') as f: json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+class ChangeSender:
+    # Live input goes out as soon as the packet changes, rate-capped, with a slow keepalive in between
+    def __init__(self, keepalive=KEEPALIVE_INTERVAL, min_interval=MIN_SEND_INTERVAL):
+        self.keepalive = keepalive
+        self.min_interval = min_interval
+        self.wake = threading.Event()
+        self.last_packet = None
+        self.last_send = float("-inf")
+        self.pending = False
+        self.changes = 0
+        self.keepalives = 0
+        self.deferred = 0
+
+    def notify(self):
+        self.wake.set()
+
+    def wait(self):
+        interval = self.min_interval if self.pending else self.keepalive
+        self.wake.wait(max(0.0, self.last_send + interval - time.perf_counter()))
+        self.wake.clear()
+
+    def offer(self, packet, now):
+        changed = packet != self.last_packet
+        if changed and now - self.last_send < self.min_interval:
+            if not self.pending: self.deferred += 1
+            self.pending = True
+            return False
+        if not changed and now - self.last_send < self.keepalive: return False
+        if changed: self.changes += 1
+        else: self.keepalives += 1
+        self.pending = False
+        self.last_packet = packet
+        self.last_send = now
+        return True
+
+class Target:
+    # One console: its own connected non-blocking socket, so a dead unit only costs its own counters
+    def __init__(self, host, port=INPUT_REDIRECTION_PORT, offset=0.0):
+        self.host = host
+        self.port = port
+        self.offset = offset
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.last_error = ""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        try: self.sock.connect((host, port))
+        except OSError:
+            self.sock.close()
+            raise
+
+    def send(self, ba):
+        try:
+            self.sock.send(ba)
+            self.sent += 1
+        except BlockingIOError:
+            self.dropped += 1
+        except OSError as e:
+            # e.g. ECONNREFUSED surfaced from an earlier ICMP error
+            self.errors += 1
+            self.last_error = str(e)
+
+    def close(self):
+        self.sock.close()
+
+    def stats(self):
+        return {"target": f"{self.host}:{self.port}", "offset_ms": round(self.offset * 1e3, 3), "sent": self.sent,
+                "errors": self.errors, "dropped": self.dropped, "last_error": self.last_error}
+
+class TargetPool:
+    # Fans each encoded packet out to every console; targets with a timing offset go through a delay queue
+    def __init__(self):
+        self.targets = []
+        self.delayed = []
+        self.order = itertools.count()
+        self.cond = threading.Condition()
+        self.worker = None
+        self.in_flight = 0
+
+    def set_targets(self, specs):
+        old = {(t.host, t.port): t for t in self.targets}
+        targets = []
+        for host, port, offset in specs:
+            t = old.pop((host, port), None) or Target(host, port)
+            t.offset = offset
+            targets.append(t)
+        self.targets = targets
+        for t in old.values(): t.close()
+
+    def send(self, ba):
+        targets = self.targets
+        delayed = False
+        for t in targets:
+            if t.offset > 0: delayed = True
+            else: t.send(ba)
+        if delayed: self.schedule(ba, targets)
+
+    def schedule(self, ba, targets):
+        now = time.perf_counter()
+        data = bytes(ba)
+        with self.cond:
+            for t in targets:
+                if t.offset > 0: heapq.heappush(self.delayed, (now + t.offset, next(self.order), t, data))
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run_delayed, daemon=True)
+                self.worker.start()
+            self.cond.notify()
+
+    def run_delayed(self):
+        while True:
+            with self.cond:
+                while not self.delayed: self.cond.wait()
+                wait = self.delayed[0][0] - time.perf_counter()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                _, _, t, data = heapq.heappop(self.delayed)
+                self.in_flight += 1
+            t.send(data)
+            with self.cond:
+                self.in_flight -= 1
+                self.cond.notify_all()
+
+    def flush(self, timeout=1.0):
+        end = time.perf_counter() + timeout
+        with self.cond:
+            while (self.delayed or self.in_flight) and time.perf_counter() < end: self.cond.wait(0.005)
+
+    def stats(self):
+        return [t.stats() for t in self.targets]
+
+def parse_targets(text):
+    # "host[:port][@offset_ms]", comma separated
+    specs = []
+    for item in text.replace(";", ",").split(","):
+        item = item.strip()
+        if not item: continue
+        host, _, offset = item.partition("@")
+        host, _, port = host.partition(":")
+        specs.append((host.strip(), int(port) if port else INPUT_REDIRECTION_PORT, float(offset) / 1e3 if offset else 0.0))
+    return specs
+
+def set_targets(text):
+    state.targets.set_targets(parse_targets(text))
+    state.ipAddress = text
+
+# Immutable input snapshots: each source builds a complete one and swaps it in with a single assignment,
+# so the sender reading state.pad / state.touch never sees half of an update
+InputSnapshot = namedtuple("InputSnapshot", "buttons interface lx ly rx ry", defaults=(0, 0, 0.0, 0.0, 0.0, 0.0))
+TouchSnapshot = namedtuple("TouchSnapshot", "pressed position", defaults=(False, (0, 0)))
+
+class GlobalState:
+    pad = InputSnapshot()
+    touch = TouchSnapshot()
+    ipAddress = ""
+    yAxisMultiplier = 1
+    abInverse = False
+    xyInverse = False
+    
+    settings = None
+    button_map = None
+    
+    # TAS state
+    is_recording = False
+    is_playing = False
+    tas_events = None
+    input_log = None
+    tas_player = None
+    current_play_idx = 0
+    # Closed-loop replay: frames playback holds at until opened, a hold flag and a pending jump (see heartbeat_loop)
+    play_events = None
+    play_gates = set()
+    gate_frames = ()
+    play_hold = False
+    play_jump = None
+    play_last = None
+    held_ticks = 0
+    
+    targets = TargetPool()
+    heartbeat_running = False
+    scheduler = None
+    tick_rate = TICK_RATE
+    tracer = LatencyTracer()
+    sender = ChangeSender()
+
+state = GlobalState()
+
+class DefaultSettings:
+    # Stand-in for QSettings when running headless: every key reads as its default
+    def value(self, key, default=None, type=None):
+        return default
+
+def setting_int(settings, key, default=0):
+    # Free-text settings (e.g. the touch button coordinates) read as the default when blank or not a whole number
+    try: return int(settings.value(key, default))
+    except (TypeError, ValueError): return default
+
+def variant_to_button(val):
+    if val is None: return GamepadButtons.ButtonInvalid
+    try:
+        return int(val)
+    except:
+        return GamepadButtons.ButtonInvalid
+
+HID_BUTTON_KEYS = (("ButtonA", GamepadButtons.ButtonA), ("ButtonB", GamepadButtons.ButtonB),
+                   ("ButtonSelect", GamepadButtons.ButtonSelect), ("ButtonStart", GamepadButtons.ButtonStart),
+                   ("ButtonRight", GamepadButtons.ButtonRight), ("ButtonLeft", GamepadButtons.ButtonLeft),
+                   ("ButtonUp", GamepadButtons.ButtonUp), ("ButtonDown", GamepadButtons.ButtonDown),
+                   ("ButtonR", GamepadButtons.ButtonR1), ("ButtonL", GamepadButtons.ButtonL1),
+                   ("ButtonX", GamepadButtons.ButtonX), ("ButtonY", GamepadButtons.ButtonY))
+IR_BUTTON_KEYS = (("ButtonZR", GamepadButtons.ButtonR2), ("ButtonZL", GamepadButtons.ButtonL2))
+INTERFACE_BUTTON_KEYS = ("ButtonHome", "ButtonPower", "ButtonPowerLong")
+# Layout of a compiled lookup word: HID pad bits pressed, IR byte, interface bits, touch shortcuts
+IR_SHIFT = 16
+INTERFACE_SHIFT = 24
+TOUCH1_BIT = 1 << 28
+TOUCH2_BIT = 1 << 29
+
+ButtonMap = namedtuple("ButtonMap", ["tables", "touch1", "touch2"])
+
+def compile_button_map(settings, ab_inverse=False, xy_inverse=False):
+    def get_btn(name, default):
+        return variant_to_button(settings.value(name, default))
+
+    hid = [get_btn(name, default) for name, default in HID_BUTTON_KEYS]
+    if ab_inverse: hid[0], hid[1] = hid[1], hid[0]
+    if xy_inverse: hid[10], hid[11] = hid[11], hid[10]
+    outputs = [(btn, 1 << i) for i, btn in enumerate(hid)]
+    outputs += [(get_btn(name, default), 1 << (IR_SHIFT + i + 1)) for i, (name, default) in enumerate(IR_BUTTON_KEYS)]
+    outputs += [(get_btn(name, GamepadButtons.ButtonInvalid), 1 << (INTERFACE_SHIFT + i)) for i, name in enumerate(INTERFACE_BUTTON_KEYS)]
+    outputs += [(get_btn("ButtonT1", GamepadButtons.ButtonInvalid), TOUCH1_BIT),
+                (get_btn("ButtonT2", GamepadButtons.ButtonInvalid), TOUCH2_BIT)]
+
+    per_button = [0] * 24
+    for btn, bit in outputs:
+        if 0 <= btn < len(per_button): per_button[btn] |= bit
+
+    # One 256-entry table per byte of the gamepad bitmask
+    tables = []
+    for chunk in range(3):
+        table = [0] * 256
+        for value in range(1, 256):
+            low = value & -value
+            table[value] = table[value ^ low] | per_button[chunk * 8 + low.bit_length() - 1]
+        tables.append(tuple(table))
+
+    touch1 = (setting_int(settings, "touchButton1X"), setting_int(settings, "touchButton1Y"))
+    touch2 = (setting_int(settings, "touchButton2X"), setting_int(settings, "touchButton2Y"))
+    return ButtonMap(tuple(tables), touch1, touch2)
+
+def rebuild_button_map():
+    state.button_map = compile_button_map(state.settings, state.abInverse, state.xyInverse)
+
+def map_buttons(button_map, buttons):
+    t = button_map.tables
+    return t[0][buttons & 0xff] | t[1][(buttons >> 8) & 0xff] | t[2][(buttons >> 16) & 0xff]
+
+def get_packet_data():
+    button_map = state.button_map
+    if button_map is None: return None
+
+    pad, touch = state.pad, state.touch
+    mapped = map_buttons(button_map, pad.buttons)
+    hidPad = 0xfff & ~mapped
+    irButtonsState = (mapped >> IR_SHIFT) & 0xff
+
+    touchScreenState = 0x2000000 
+    circlePadState = 0x7ff7ff
+    cppState = 0x80800081
+
+    if pad.lx != 0.0 or pad.ly != 0.0:
+        x = int(pad.lx * CPAD_BOUND + 0x800)
+        y = int(pad.ly * CPAD_BOUND + 0x800)
+        x = max(0, min(0xfff, x))
+        y = max(0, min(0xfff, y))
+        circlePadState = (y << 12) | x
+
+    if pad.rx != 0.0 or pad.ry != 0.0 or irButtonsState != 0:
+        x_val = math.sqrt(0.5) * (pad.rx + pad.ry) * CPP_BOUND + 0x80
+        y_val = math.sqrt(0.5) * (pad.ry - pad.rx) * CPP_BOUND + 0x80
+        x, y = int(x_val), int(y_val)
+        x = max(0, min(0xff, x))
+        y = max(0, min(0xff, y))
+        cppState = (y << 24) | (x << 16) | (irButtonsState << 8) | 0x81
+
+    # Touch buttons on the pad win over the mouse
+    if mapped & TOUCH1_BIT: touch = (True, button_map.touch1)
+    elif mapped & TOUCH2_BIT: touch = (True, button_map.touch2)
+    if touch[0]:
+        tx = max(0, min(touch[1][0], TOUCH_SCREEN_WIDTH))
+        ty = max(0, min(touch[1][1], TOUCH_SCREEN_HEIGHT))
+        x = int(0xfff * tx / TOUCH_SCREEN_WIDTH)
+        y = int(0xfff * ty / TOUCH_SCREEN_HEIGHT)
+        touchScreenState = (1 << 24) | (y << 12) | x
+
+    interface = pad.interface | ((mapped >> INTERFACE_SHIFT) & 7)
+    return struct.pack('<IIIII', hidPad, touchScreenState, circlePadState, cppState, interface)
+
+def get_release_packet():
+    return struct.pack('<IIIII', 0xfff, 0x2000000, 0x7ff7ff, 0x80800081, 0)
+
+def send_packet(ba):
+    state.targets.send(ba)
+
+class EventRecording:
+    # Packets appended back to back into one growable buffer, no per-frame objects
+    def __init__(self, data=b"", tick_rate=TICK_RATE, meta=None):
+        self.data = bytearray(data)
+        self.tick_rate = tick_rate
+        self.meta = meta or {}
+
+    def append(self, packet):
+        self.data += packet
+
+    def __len__(self):
+        return len(self.data) // PACKET_SIZE
+
+    def frames(self, start=0):
+        # Play a bytes snapshot: a paused generator holding a view of the bytearray would make append() fail
+        mv = memoryview(bytes(self.data))
+        for off in range(start * PACKET_SIZE, len(mv) - PACKET_SIZE + 1, PACKET_SIZE):
+            yield mv[off:off + PACKET_SIZE]
+
+    def close(self):
+        pass # nothing mapped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class EventFile:
+    # Read-only view of a binary event file; playback yields slices of the mapping directly
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try: self.read_header()
+        except ValueError:
+            self.mm.close()
+            raise
+
+    def read_header(self):
+        if len(self.mm) < EVENT_HEADER.size: raise ValueError("Truncated event file")
+        magic, version, self.flags, self.tick_us, self.frame_count, self.record_count, meta_len = EVENT_HEADER.unpack_from(self.mm, 0)
+        if magic != EVENT_MAGIC: raise ValueError("Not an event file")
+        if version > EVENT_VERSION: raise ValueError(f"Unsupported event file version {version}")
+        self.offset = EVENT_HEADER.size + meta_len
+        record_size = PACKET_SIZE + (EVENT_RUN.size if self.flags & EVENT_RLE else 0)
+        if self.offset + self.record_count * record_size > len(self.mm): raise ValueError("Truncated event file")
+        self.meta = json.loads(self.mm[EVENT_HEADER.size:self.offset] or b"{}")
+        self.tick_rate = self.tick_us / 1e6
+
+    def close(self):
+        # Only once playback let go of the file: a running generator still holds views of the mapping
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.frame_count
+
+    def frames(self, start=0):
+        mv = memoryview(self.mm)
+        off = self.offset
+        if self.flags & EVENT_RLE:
+            skip = start
+            for _ in range(self.record_count):
+                count, = EVENT_RUN.unpack_from(mv, off)
+                packet = mv[off + EVENT_RUN.size:off + EVENT_RUN.size + PACKET_SIZE]
+                off += EVENT_RUN.size + PACKET_SIZE
+                if skip >= count:
+                    skip -= count
+                    continue
+                for _ in range(count - skip): yield packet
+                skip = 0
+        else:
+            off += start * PACKET_SIZE
+            for _ in range(start, self.record_count):
+                yield mv[off:off + PACKET_SIZE]
+                off += PACKET_SIZE
+
+def save_events(path, events, rle=True):
+    import numpy as np # only needed when saving; keeps headless replay startup light
+    if isinstance(events, EventRecording): data = bytes(events.data)
+    else: data = b"".join(bytes(f) for f in events.frames())
+    frames = np.frombuffer(data, dtype=np.uint8).reshape(-1, PACKET_SIZE)
+    meta_bytes = json.dumps(events.meta).encode()
+    flags = 0
+    if rle and len(frames):
+        starts = np.flatnonzero(np.r_[True, np.any(frames[1:] != frames[:-1], axis=1)])
+        counts = np.diff(np.r_[starts, len(frames)]).astype('<u4')
+        records = np.empty((len(starts), EVENT_RUN.size + PACKET_SIZE), dtype=np.uint8)
+        records[:, :EVENT_RUN.size] = counts.view(np.uint8).reshape(-1, EVENT_RUN.size)
+        records[:, EVENT_RUN.size:] = frames[starts]
+        # Only keep the run-length form when it actually saves space
+        if records.nbytes < frames.nbytes: flags, frames = EVENT_RLE, records
+    header = EVENT_HEADER.pack(EVENT_MAGIC, EVENT_VERSION, flags, int(round(events.tick_rate * 1e6)),
+                               len(data) // PACKET_SIZE, len(frames), len(meta_bytes))
+    # The events may be a view of this very file's mapping, so never truncate it in place
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(header); f.write(meta_bytes); f.write(frames.tobytes())
+    os.replace(tmp, path)
+
+def load_events(path, tick_rate=None):
+    with open(path, 'rb') as f: magic = f.read(len(EVENT_MAGIC))
+    if magic == EVENT_MAGIC: return EventFile(path)
+    if magic == LOG_MAGIC:
+        log = load_log(path)
+        return Timeline.from_log(log).render(tick_rate or TICK_RATE, log.meta)
+    # Legacy JSON list of hex packets
+    with open(path, 'r') as f: frames = json.load(f)
+    return EventRecording(b"".join(bytes.fromhex(h) for h in frames))
+
+class InputLog:
+    # Every input change at full resolution: microsecond offsets in an array('q'), packets back to back in a bytearray
+    def __init__(self, times=None, packets=None, meta=None):
+        self.times = array('q') if times is None else times
+        self.packets = bytearray() if packets is None else packets
+        self.meta = meta or {}
+        self.start = None
+        self.lock = threading.Lock()
+
+    def record(self, t, packet):
+        # Called for every input change (gamepad, touch, keys); identical consecutive states are not stored
+        with self.lock:
+            if self.start is None: self.start = t
+            if self.packets and self.packets[-PACKET_SIZE:] == packet: return
+            us = int((t - self.start) * 1e6)
+            self.times.append(max(us, self.times[-1]) if self.times else us)
+            self.packets += packet
+
+    def __len__(self):
+        return len(self.times)
+
+    def duration_us(self):
+        return int(self.times[-1]) if len(self.times) else 0
+
+    def arrays(self):
+        # (times, packets) as numpy arrays; loaded logs are views of the file mapping, live ones are copied
+        import numpy as np
+        if isinstance(self.times, array):
+            with self.lock:
+                return np.array(self.times, dtype=np.int64), np.frombuffer(bytes(self.packets), dtype=np.uint8).reshape(-1, PACKET_SIZE)
+        return self.times, self.packets
+
+def save_log(path, log):
+    times, packets = log.arrays()
+    meta_bytes = json.dumps(log.meta).encode()
+    # A loaded log is a view of its file's mapping: write aside and swap, so saving over it never truncates what is being read
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, 0, len(times), len(meta_bytes)))
+        f.write(meta_bytes); f.write(times.astype('<i8').tobytes()); f.write(packets.tobytes())
+    os.replace(tmp, path)
+
+def load_log(path):
+    import numpy as np
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if len(mm) < LOG_HEADER.size: raise ValueError("Truncated input log")
+        magic, version, _, count, meta_len = LOG_HEADER.unpack_from(mm, 0)
+        if magic != LOG_MAGIC: raise ValueError("Not an input log")
+        if version > LOG_VERSION: raise ValueError(f"Unsupported input log version {version}")
+        off = LOG_HEADER.size + meta_len
+        if off + count * (8 + PACKET_SIZE) > len(mm): raise ValueError("Truncated input log")
+    except ValueError:
+        mm.close()
+        raise
+    times = np.frombuffer(mm, dtype='<i8', count=count, offset=off)
+    packets = np.frombuffer(mm, dtype=np.uint8, count=count * PACKET_SIZE, offset=off + 8 * count).reshape(-1, PACKET_SIZE)
+    return InputLog(times, packets, json.loads(mm[LOG_HEADER.size:off] or b"{}"))
+
+# A stretch of a source log, [start, end) in source microseconds, played at speed
+Segment = namedtuple("Segment", "log start end speed")
+
+class Timeline:
+    # Edit list over input logs. Edits split and rearrange segments and never touch the event arrays,
+    # so they cost O(segments) however long the logs are; every edit returns a new Timeline (a branch)
+    def __init__(self, segments=()):
+        self.segments = list(segments)
+
+    @classmethod
+    def from_log(cls, log):
+        return cls([Segment(log, 0, log.duration_us() + 1, 1.0)])
+
+    def duration_us(self):
+        return sum((seg.end - seg.start) / seg.speed for seg in self.segments)
+
+    def split(self, segments, t):
+        # Make t (output microseconds) a segment boundary; returns the index of the segment starting there
+        pos = 0.0
+        for i, seg in enumerate(segments):
+            length = (seg.end - seg.start) / seg.speed
+            if t <= pos: return i
+            if t < pos + length:
+                cut = seg.start + round((t - pos) * seg.speed)
+                segments[i:i + 1] = [seg._replace(end=cut), seg._replace(start=cut)]
+                return i + 1
+            pos += length
+        return len(segments)
+
+    def span(self, start, end):
+        segments = list(self.segments)
+        i = self.split(segments, start)
+        j = self.split(segments, end)
+        return segments, i, j
+
+    def branch(self):
+        return Timeline(self.segments)
+
+    def excerpt(self, start, end):
+        segments, i, j = self.span(start, end)
+        return Timeline(segments[i:j])
+
+    def cut(self, start, end):
+        segments, i, j = self.span(start, end)
+        del segments[i:j]
+        return Timeline(segments)
+
+    def splice(self, at, other):
+        segments = list(self.segments)
+        i = self.split(segments, at)
+        segments[i:i] = other.segments
+        return Timeline(segments)
+
+    def loop(self, start, end, times):
+        segments, i, j = self.span(start, end)
+        segments[i:j] = segments[i:j] * times
+        return Timeline(segments)
+
+    def stretch(self, start, end, factor):
+        # factor > 1 plays the span slower (longer), < 1 faster
+        segments, i, j = self.span(start, end)
+        segments[i:j] = [seg._replace(speed=seg.speed / factor) for seg in segments[i:j]]
+        return Timeline(segments)
+
+    def events(self):
+        # Flatten to (output times in us, packets); each segment opens with the state held at its start
+        import numpy as np
+        times, packets, pos = [], [], 0.0
+        release = np.frombuffer(get_release_packet(), dtype=np.uint8)
+        for seg in self.segments:
+            t, p = seg.log.arrays()
+            lo, hi = np.searchsorted(t, [seg.start, seg.end])
+            if lo == hi or t[lo] > seg.start:
+                times.append(np.array([pos]))
+                packets.append((p[lo - 1] if lo > 0 else release)[None])
+            times.append(pos + (t[lo:hi] - seg.start) / seg.speed)
+            packets.append(p[lo:hi])
+            pos += (seg.end - seg.start) / seg.speed
+        if not times: return np.zeros(0), np.zeros((0, PACKET_SIZE), dtype=np.uint8)
+        return np.concatenate(times), np.concatenate(packets)
+
+    def to_log(self):
+        times, packets = self.events()
+        return InputLog(times.round().astype('<i8'), packets)
+
+    def render(self, tick_rate=TICK_RATE, meta=None):
+        times, packets = self.events()
+        meta = dict(meta or {}, render={"rate_hz": round(1.0 / tick_rate, 3), "events": len(times)})
+        return EventRecording(render_ticks(times, packets, tick_rate), tick_rate, meta)
+
+def render_ticks(times, packets, tick_rate):
+    # One packet per tick, each event sent on the first tick at or after it. Button/touch/interface changes
+    # get a tick each, pushed up to RENDER_MAX_PUSH ticks later when several land in one tick, so taps
+    # shorter than a tick survive; stick-only changes within a tick collapse to the latest.
+    import numpy as np
+    if not len(times): return b""
+    period = tick_rate * 1e6
+    natural = np.ceil(times / period - 1e-9).astype(np.int64)
+    digital = packets[:, [0, 1, 7, 13, 16]]
+    changed = np.r_[True, np.any(digital[1:] != digital[:-1], axis=1)]
+    d_idx = np.flatnonzero(changed)
+    d_ticks = np.zeros(len(times), dtype=np.int64)
+    d_ticks[d_idx] = list(itertools.accumulate(natural[d_idx].tolist(), lambda prev, n: min(max(n, prev + 1), n + RENDER_MAX_PUSH)))
+    last_d = np.maximum.accumulate(np.where(changed, np.arange(len(times)), 0))
+    ticks = np.maximum(natural, d_ticks[last_d])
+    idx = np.searchsorted(ticks, np.arange(ticks[-1] + 1), side='right') - 1
+    frames = packets[np.maximum(idx, 0)]
+    frames[idx < 0] = np.frombuffer(get_release_packet(), dtype=np.uint8)
+    return frames.tobytes()
+
+def input_changed(source, t_input):
+    state.tracer.mark(source, t_input)
+    log = state.input_log
+    if state.is_recording and log is not None:
+        ba = get_packet_data()
+        if ba: log.record(t_input, ba)
+    state.sender.notify()
+
+def start_playback(events, gates=()):
+    state.current_play_idx = 0
+    state.play_events = events
+    state.tas_player = events.frames()
+    state.gate_frames = tuple(gates)
+    state.play_gates = set(gates)
+    state.play_hold = False
+    state.play_jump = None
+    state.play_last = get_release_packet()
+    state.held_ticks = 0
+    # Replay at the rate the events were recorded at
+    state.scheduler.set_period(events.tick_rate)
+    state.is_playing = True
+    state.sender.notify()
+
+def stop_playback():
+    state.is_playing = False
+    state.scheduler.set_period(state.tick_rate)
+    send_packet(get_release_packet())
+
+def send_live(ba, t_encode):
+    tracer = state.tracer
+    t_encoded = time.perf_counter() if tracer.enabled else 0.0
+    send_packet(ba)
+    if tracer.enabled: tracer.sent(t_encode, t_encoded, time.perf_counter())
+
+def heartbeat_loop(until=None):
+    scheduler, sender = state.scheduler, state.sender
+    ticking = True
+    while state.heartbeat_running:
+        if state.is_playing:
+            # Replays need exactly one packet per tick
+            if not ticking:
+                scheduler.restart()
+                ticking = True
+            scheduler.wait()
+            jump = state.play_jump
+            if jump is not None:
+                state.play_jump = None
+                state.tas_player = state.play_events.frames(jump)
+                state.current_play_idx = jump
+                # Gates ahead of the jump target close again, so a retried section waits like the first time;
+                # gates jumped over are passed, or they would stay active (and time out) for the rest of the run
+                state.play_gates = {g for g in state.gate_frames if g >= jump}
+            if state.play_hold or state.current_play_idx in state.play_gates:
+                # Waiting on the screen: keep the console in the last played state
+                send_packet(state.play_last)
+                state.held_ticks += 1
+            else:
+                ba = next(state.tas_player, None)
+                if ba is not None:
+                    send_packet(ba)
+                    state.play_last = bytes(ba) # not a view: the file behind it may be closed while held
+
+                    state.current_play_idx += 1
+                else:
+                    stop_playback()
+        else:
+            ticking = False
+            sender.wait()
+            t_encode = time.perf_counter()
+            ba = get_packet_data()
+            if not ba: time.sleep(state.tick_rate)
+            else:
+                if ba == sender.last_packet: state.tracer.discard(t_encode)
+                if sender.offer(ba, time.perf_counter()): send_live(ba, t_encode)
+        if until and until(): break
+
+HID_BIT_NAMES = ("A", "B", "SELECT", "START", "RIGHT", "LEFT", "UP", "DOWN", "R", "L", "X", "Y")
+IR_BIT_NAMES = {1: "ZR", 2: "ZL"}
+INTERFACE_BIT_NAMES = ("HOME", "POWER", "POWERLONG")
+
+def decode_packet(ba):
+    hid, touch, cpad, cpp, iface = struct.unpack('<IIIII', ba)
+    buttons = [name for i, name in enumerate(HID_BIT_NAMES) if not hid & (1 << i)]
+    buttons += [name for bit, name in IR_BIT_NAMES.items() if (cpp >> 8) & (1 << bit)]
+    return {
+        "buttons": buttons,
+        "interface": [name for i, name in enumerate(INTERFACE_BIT_NAMES) if iface & (1 << i)],
+        "touch": [round((touch & 0xfff) * TOUCH_SCREEN_WIDTH / 0xfff), round(((touch >> 12) & 0xfff) * TOUCH_SCREEN_HEIGHT / 0xfff)]
+                 if touch & (1 << 24) else None,
+        "cpad": [round(((cpad & 0xfff) - 0x800) / CPAD_BOUND, 3), round((((cpad >> 12) & 0xfff) - 0x800) / CPAD_BOUND, 3)],
+        "cstick": [((cpp >> 16) & 0xff) - 0x80, ((cpp >> 24) & 0xff) - 0x80],
+    }
+
+class StandInServer:
+    # Local InputRedirection receiver: decodes what a 3DS would get and measures how it arrived
+    def __init__(self, host="127.0.0.1", port=INPUT_REDIRECTION_PORT, rate_hz=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.1)
+        self.period = 1.0 / rate_hz if rate_hz else None
+        self.running = False
+        self.arrivals = []
+        self.timeline = []
+        self.malformed = 0
+        self.repeated = 0
+        self.last_packet = None
+
+    def run(self, duration=None, count=None, idle_timeout=None):
+        self.running = True
+        end = time.perf_counter() + duration if duration else None
+        while self.running:
+            now = time.perf_counter()
+            if end and now >= end: break
+            if count and len(self.arrivals) >= count: break
+            if idle_timeout and self.arrivals and now - self.arrivals[-1] >= idle_timeout: break
+            try: ba = self.sock.recv(64)
+            except socket.timeout: continue
+            self.receive(ba, time.perf_counter())
+        self.running = False
+
+    def receive(self, ba, now):
+        if len(ba) != PACKET_SIZE:
+            self.malformed += 1
+            return
+        self.arrivals.append(now)
+        if ba == self.last_packet:
+            self.repeated += 1
+            return
+        self.last_packet = ba
+        self.timeline.append((now, decode_packet(ba)))
+
+    def stop(self):
+        self.running = False
+
+    def report(self):
+        t0 = self.arrivals[0] if self.arrivals else 0.0
+        deltas = sorted(b - a for a, b in zip(self.arrivals, self.arrivals[1:]))
+        report = {"packets": len(self.arrivals), "malformed": self.malformed, "repeated": self.repeated,
+                  "changes": len(self.timeline),
+                  "duration_s": round(self.arrivals[-1] - t0, 6) if self.arrivals else 0.0}
+        if deltas:
+            mean = sum(deltas) / len(deltas)
+            report["interarrival_ms"] = {
+                "mean": round(mean * 1e3, 3),
+                "stdev": round(1e3 * (sum((d - mean) ** 2 for d in deltas) / len(deltas)) ** 0.5, 3),
+                "min": round(deltas[0] * 1e3, 3),
+                "p99": round(deltas[min(len(deltas) - 1, int(0.99 * len(deltas)))] * 1e3, 3),
+                "max": round(deltas[-1] * 1e3, 3),
+            }
+        if deltas and self.period:
+            # Against a fixed tick rate: a gap spanning k periods lost k-1 ticks, two arrivals in one period are a duplicate
+            ticks = [round(d / self.period) for d in deltas]
+            jitter = sorted(abs(d - max(t, 1) * self.period) for d, t in zip(deltas, ticks))
+            report["ticks"] = {
+                "expected_ms": round(self.period * 1e3, 3),
+                "lost": sum(t - 1 for t in ticks if t > 1),
+                "duplicated": sum(1 for t in ticks if t == 0),
+                "jitter_mean_ms": round(1e3 * sum(jitter) / len(jitter), 3),
+                "jitter_p99_ms": round(1e3 * jitter[min(len(jitter) - 1, int(0.99 * len(jitter)))], 3),
+            }
+        report["timeline"] = [{"t": round(t - t0, 6), **s} for t, s in self.timeline]
+        return report
+
+BUTTON_NAMES = {"A": GamepadButtons.ButtonA, "B": GamepadButtons.ButtonB, "X": GamepadButtons.ButtonX,
+                "Y": GamepadButtons.ButtonY, "L": GamepadButtons.ButtonL1, "R": GamepadButtons.ButtonR1,
+                "ZL": GamepadButtons.ButtonL2, "ZR": GamepadButtons.ButtonR2, "SELECT": GamepadButtons.ButtonSelect,
+                "START": GamepadButtons.ButtonStart, "UP": GamepadButtons.ButtonUp, "DOWN": GamepadButtons.ButtonDown,
+                "LEFT": GamepadButtons.ButtonLeft, "RIGHT": GamepadButtons.ButtonRight}
+INTERFACE_NAMES = {"HOME": 1, "POWER": 2, "POWERLONG": 4}
+
+def parse_point(text):
+    x, y = text.split(",")
+    return int(x), int(y)
+
+def cmd_replay(args):
+    with load_events(args.file, 1.0 / args.rate if args.rate else None) as events:
+        if args.rate: events.tick_rate = 1.0 / args.rate
+        for _ in range(args.loop):
+            start_playback(events)
+            heartbeat_loop(until=lambda: not state.is_playing)
+        state.tas_player = None
+    state.targets.flush()
+    print(json.dumps({"timing": state.scheduler.stats(), "targets": state.targets.stats()}))
+
+def cmd_send(args):
+    state.button_map = compile_button_map(DefaultSettings())
+    buttons = interface = 0
+    for name in args.buttons:
+        name = name.upper()
+        if name in BUTTON_NAMES: buttons |= 1 << BUTTON_NAMES[name]
+        elif name in INTERFACE_NAMES: interface |= INTERFACE_NAMES[name]
+        else: raise ValueError(f"Unknown button {name}")
+    state.pad = InputSnapshot(buttons, interface, *args.cpad, *args.cstick)
+    if args.touch: state.touch = TouchSnapshot(True, tuple(args.touch))
+    ba = get_packet_data()
+    end = time.perf_counter() + args.hold
+    while True:
+        send_packet(ba)
+        remaining = end - time.perf_counter()
+        if remaining <= 0: break
+        time.sleep(min(KEEPALIVE_INTERVAL, remaining))
+    send_packet(get_release_packet())
+    state.targets.flush()
+
+def cmd_serve(args):
+    server = StandInServer(args.host, args.port, args.rate)
+    print(f"listening on {args.host}:{args.port}", file=sys.stderr)
+    try: server.run(args.duration, args.count, args.idle_timeout)
+    except KeyboardInterrupt: pass
+    report = server.report()
+    if not args.timeline: del report["timeline"]
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(text + "\n")
+    else:
+        print(text)
+
+EDIT_OPS = {"cut": (2,), "keep": (2,), "loop": (3,), "stretch": (3,), "splice": (2, 4)} # accepted value counts
+
+def apply_edit(timeline, op):
+    # op is name:args with times in seconds, e.g. cut:1.5:2, loop:3:4:10, stretch:0:5:0.5, splice:12:other.log[:start:end]
+    name, _, rest = op.partition(":")
+    if name not in EDIT_OPS: raise ValueError(f"Unknown edit {name}")
+    fields = rest.split(":")
+    if len(fields) not in EDIT_OPS[name]: raise ValueError(f"{name} takes {' or '.join(map(str, EDIT_OPS[name]))} values")
+    if name == "splice":
+        at, path, span = float(fields[0]), fields[1], [float(v) * 1e6 for v in fields[2:4]]
+        other = Timeline.from_log(load_log(path))
+        if span: other = other.excerpt(*span)
+        return timeline.splice(at * 1e6, other)
+    start, end = float(fields[0]) * 1e6, float(fields[1]) * 1e6
+    if name == "cut": return timeline.cut(start, end)
+    if name == "keep": return timeline.excerpt(start, end)
+    if name == "loop": return timeline.loop(start, end, int(fields[2]))
+    return timeline.stretch(start, end, float(fields[2]))
+
+def cmd_edit(args):
+    log = load_log(args.file)
+    timeline = Timeline.from_log(log)
+    for op in args.op: timeline = apply_edit(timeline, op)
+    meta = dict(log.meta, edits=log.meta.get("edits", []) + args.op)
+    if args.out.endswith(".log"):
+        edited = timeline.to_log()
+        edited.meta = meta
+        save_log(args.out, edited)
+        frames = None
+    else:
+        events = timeline.render(state.tick_rate, meta)
+        save_events(args.out, events)
+        frames = len(events)
+    print(json.dumps({"segments": len(timeline.segments), "duration_s": round(timeline.duration_us() / 1e6, 6), "frames": frames}))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="3dsc2", description="Headless InputRedirection control")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay = sub.add_parser("replay", help="play an event file")
+    replay.add_argument("file")
+    replay.add_argument("--loop", type=int, default=1, help="play the file this many times")
+    replay.set_defaults(func=cmd_replay)
+
+    send = sub.add_parser("send", help="hold an input state, then release")
+    send.add_argument("buttons", nargs="*", help=f"any of {', '.join(list(BUTTON_NAMES) + list(INTERFACE_NAMES))}")
+    send.add_argument("--cpad", type=float, nargs=2, default=(0.0, 0.0), metavar=("X", "Y"))
+    send.add_argument("--cstick", type=float, nargs=2, default=(0.0, 0.0), metavar=("X", "Y"))
+    send.add_argument("--touch", type=parse_point, metavar="X,Y")
+    send.add_argument("--hold", type=float, default=0.1, help="seconds to hold before releasing")
+    send.set_defaults(func=cmd_send)
+
+    for p in (replay, send):
+        p.add_argument("--ip", required=True, help="3DS address(es): host[:port][@offset_ms], comma separated")
+        p.add_argument("--rate", type=int, choices=TICK_RATES_HZ, help="tick rate in Hz")
+
+    edit = sub.add_parser("edit", help="edit an input log (.log) and render it to an event file or a new log")
+    edit.add_argument("file")
+    edit.add_argument("--op", action="append", default=[], metavar="EDIT",
+                      help="applied in order: cut:A:B, keep:A:B, loop:A:B:N, stretch:A:B:FACTOR, splice:AT:FILE[:A:B] (seconds)")
+    edit.add_argument("--out", required=True, help="*.bin renders packets at --rate, *.log keeps full resolution")
+    edit.add_argument("--rate", type=float, help="tick rate in Hz to render at (any rate)")
+    edit.set_defaults(func=cmd_edit)
+
+    serve = sub.add_parser("serve", help="stand in for a 3DS: receive, decode and time packets")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=INPUT_REDIRECTION_PORT)
+    serve.add_argument("--rate", type=int, help="expected tick rate in Hz, enables lost/duplicate tick counts")
+    serve.add_argument("--duration", type=float, help="stop after this many seconds")
+    serve.add_argument("--count", type=int, help="stop after this many packets")
+    serve.add_argument("--idle-timeout", type=float, help="stop once no packet arrived for this many seconds")
+    serve.add_argument("--timeline", action="store_true", help="include the decoded state timeline")
+    serve.add_argument("--out", help="write the JSON report here instead of stdout")
+    serve.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    if args.rate: state.tick_rate = 1.0 / args.rate
+    state.scheduler = TickScheduler(state.tick_rate)
+    state.heartbeat_running = True
+    try:
+        if args.command in ("replay", "send"): set_targets(args.ip)
+        return args.func(args) or 0
+    except KeyboardInterrupt:
+        send_packet(get_release_packet())
+        return 130
+    except (OSError, ValueError) as e:
+        print(f"3dsc2: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
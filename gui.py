@@ -0,0 +1,1380 @@
+import sys
+import os
+import json
+import threading
+import time
+import traceback
+import cv2
+import numpy as np
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
+                             QHBoxLayout, QFormLayout, QLineEdit, QPushButton, 
+                             QCheckBox, QDialog, QComboBox, QLabel, QMessageBox,
+                             QGroupBox, QTextEdit, QFileDialog)
+from PyQt6.QtCore import QTimer, QSettings, Qt, QObject, pyqtSignal
+from control import (state, GamepadButtons, TickScheduler, InputLog, Timeline, TICK_RATE, TICK_RATES_HZ,
+                     TOUCH_SCREEN_WIDTH, TOUCH_SCREEN_HEIGHT, InputSnapshot, TouchSnapshot,
+                     variant_to_button, rebuild_button_map, get_release_packet, get_packet_data,
+                     save_events, load_events, save_log, load_log, start_playback, stop_playback, heartbeat_loop,
+                     input_changed, set_targets)
+from vision import (TOP_TARGET, BOTTOM_TARGET, SUPERSAMPLE_FACTORS, STREAM_PORT, FrameRing, ScreenRecorder, ScreenStreamer,
+                    ScreenDetector, WarpEngine, TemporalDenoiser, roi_bbox, mode_text, list_cameras, open_camera,
+                    camera_mode, probe_camera)
+
+DEFAULT_ROI_FRACTION = 0.3 # share of the frame the screens cover when no ROIs are set yet
+SELECTOR_SCALE = 0.25 # ROI Selector preview scale while ROIs are locked
+SELECTOR_INTERVAL = 10 # refresh the locked preview every N frames
+COLOR_CALIBRATION_FRAMES = 8 # warped frames averaged before fitting a color LUT
+COLOR_MIN_SAMPLES = 16 # pixels needed at a camera level before it anchors the LUT
+LENS_PATTERN = (9, 6) # inner corners of the calibration checkerboard
+LENS_VIEWS = 12 # distinct checkerboard poses collected before solving
+LENS_INTERVAL = 5 # frames between checkerboard searches
+LENS_DETECT_WIDTH = 960 # checkerboard search runs on a downscaled frame
+LENS_MIN_SHIFT = 0.04 # mean corner movement (fraction of frame width) for a pose to count as new
+TRIGGER_BUDGET = 0.002 # seconds of trigger matching allowed per rendered frame
+TRIGGER_SCALE = 0.5 # triggers compare sub-regions downscaled by this much
+TRIGGER_LEVELS = 3 # template pyramid depth; the coarsest level rejects most frames cheaply
+TRIGGER_SLACK = 0.15 # a coarse score this far below the threshold is still checked at full scale
+TRIGGER_ACTIONS = ("wait", "pause", "branch")
+COLOR_PROFILE_KEYS = ("colorProfileTop", "colorProfileBottom")
+VIDEO_LAYOUTS = (("Stacked", "stacked"), ("Top", "top"), ("Bottom", "bottom"))
+JOYSTICK_EVENTS = ("JOYAXISMOTION", "JOYBUTTONDOWN", "JOYBUTTONUP", "JOYHATMOTION", "JOYDEVICEADDED", "JOYDEVICEREMOVED")
+INPUT_WAIT_MS = 100 # idle wake-up of the input thread, so it notices shutdown
+INPUT_POLL_MS = 4 # how often the GUI thread drains SDL's joystick events on macOS
+
+PYGAME_BUTTONS = ((0, GamepadButtons.ButtonA), (1, GamepadButtons.ButtonB), (2, GamepadButtons.ButtonX),
+                  (3, GamepadButtons.ButtonY), (4, GamepadButtons.ButtonL1), (5, GamepadButtons.ButtonR1),
+                  (6, GamepadButtons.ButtonSelect), (7, GamepadButtons.ButtonStart), (8, GamepadButtons.ButtonGuide),
+                  (9, GamepadButtons.ButtonL3), (10, GamepadButtons.ButtonR3))
+
+class GamepadMonitor(QObject):
+    # Own thread, woken by pygame's joystick events, so GUI stalls never delay input; each change publishes one complete
+    # InputSnapshot. SDL only delivers events to the main thread on macOS, so there the GUI thread drains them on a short timer
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.joysticks = []
+        self.last_input = None
+        self.pygame = None
+        self.running = True
+        self.thread = self.timer = None
+        if sys.platform == "darwin":
+            self.last_pump = time.perf_counter()
+            self.timer = QTimer(self)
+            self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+            self.timer.timeout.connect(self.pump)
+            # pygame is imported and initialised once the window is up, off the startup path
+            QTimer.singleShot(0, self.start)
+        else:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def init_pygame(self):
+        # Only the joystick subsystem plus the display subsystem its event queue needs; no audio, fonts or window
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        import pygame
+        pygame.display.init()
+        pygame.joystick.init()
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([getattr(pygame, name) for name in JOYSTICK_EVENTS])
+        self.pygame = pygame
+        self.rescan_joysticks()
+
+    def rescan_joysticks(self):
+        pygame = self.pygame
+        self.joysticks = [pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count())]
+        for joy in self.joysticks: joy.init()
+
+    def run(self):
+        # pygame is imported and initialised here, off the startup path, by the thread that pumps its queue
+        self.init_pygame()
+        pygame = self.pygame
+        while self.running:
+            event = pygame.event.wait(INPUT_WAIT_MS)
+            t_input = time.perf_counter()
+            self.handle([event] + pygame.event.get() if event.type != pygame.NOEVENT else [], t_input)
+        pygame.quit()
+
+    def start(self):
+        if not self.running: return
+        self.init_pygame()
+        self.last_pump = time.perf_counter()
+        self.timer.start(INPUT_POLL_MS)
+
+    def pump(self):
+        # A change seen now happened at some point since the previous pump
+        t_input, self.last_pump = self.last_pump, time.perf_counter()
+        self.handle(self.pygame.event.get(), t_input)
+
+    def handle(self, events, t_input):
+        if not events: return
+        pygame = self.pygame
+        if any(e.type in (pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED) for e in events): self.rescan_joysticks()
+        self.poll_gamepad(t_input)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None: self.thread.join(timeout=1.0)
+        else:
+            self.timer.stop()
+            if self.pygame is not None: self.pygame.quit(); self.pygame = None
+
+    def poll_gamepad(self, t_input):
+        pygame = self.pygame
+        if not self.joysticks: return
+        joy = self.joysticks[0]
+        try:
+            lx = joy.get_axis(0)
+            ly = joy.get_axis(1)
+            if abs(lx) < 0.1: lx = 0
+            if abs(ly) < 0.1: ly = 0
+            ly = state.yAxisMultiplier * -ly
+            rx = ry = 0
+            
+            if joy.get_numaxes() >= 4:
+                rx_axis = 3 if joy.get_numaxes() > 3 else 2
+                ry_axis = 4 if joy.get_numaxes() > 4 else 3
+                rx = joy.get_axis(rx_axis)
+                ry = joy.get_axis(ry_axis)
+                if abs(rx) < 0.1: rx = 0
+                if abs(ry) < 0.1: ry = 0
+                ry = state.yAxisMultiplier * -ry
+
+            current_buttons = 0
+            for py_btn, qt_btn in PYGAME_BUTTONS:
+                if py_btn < joy.get_numbuttons() and joy.get_button(py_btn):
+                    current_buttons |= (1 << qt_btn)
+            
+            if joy.get_numaxes() > 2 and joy.get_axis(2) > 0.5: current_buttons |= (1 << GamepadButtons.ButtonL2)
+            if joy.get_numaxes() > 5 and joy.get_axis(5) > 0.5: current_buttons |= (1 << GamepadButtons.ButtonR2)
+            
+            if joy.get_numhats() > 0:
+                hat = joy.get_hat(0)
+                if hat[0] == -1: current_buttons |= (1 << GamepadButtons.ButtonLeft)
+                if hat[0] == 1: current_buttons |= (1 << GamepadButtons.ButtonRight)
+                if hat[1] == 1: current_buttons |= (1 << GamepadButtons.ButtonUp)
+                if hat[1] == -1: current_buttons |= (1 << GamepadButtons.ButtonDown)
+
+            current = InputSnapshot(current_buttons, 0, lx, ly, rx, ry)
+            if current != self.last_input:
+                self.last_input = current
+                state.pad = current
+                input_changed("pygame", t_input)
+        except pygame.error: pass
+
+class RenderStats:
+    # Measured rates over a rolling window, reported about once a second. Stages are timed on the render thread,
+    # shown frames and their capture-to-display latency on the GUI thread
+    def __init__(self, window=1.0):
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset(time.perf_counter(), 0)
+        self.dropped_total = 0
+
+    def reset(self, now, capture_seq):
+        self.t0 = now
+        self.seq0 = capture_seq
+        self.rendered = 0
+        self.dropped = 0
+        self.latencies = []
+        self.stages = {}
+
+    def stage(self, name, seconds):
+        with self.lock: self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def frame(self, skipped, latency):
+        with self.lock:
+            self.rendered += 1
+            self.dropped += skipped
+            self.dropped_total += skipped
+            self.latencies.append(latency)
+
+    def report(self, now, capture_seq):
+        with self.lock:
+            dt = now - self.t0
+            if dt < self.window: return None
+            lat = self.latencies or [0.0]
+            text = (f"Capture {(capture_seq - self.seq0) / dt:.1f} fps | Render {self.rendered / dt:.1f} fps | "
+                    f"Dropped {self.dropped} ({self.dropped_total} total) | "
+                    f"Latency {1000 * sum(lat) / len(lat):.1f} ms (max {1000 * max(lat):.1f})")
+            if self.stages and self.rendered:
+                text += "\n" + " | ".join(f"{name} {1000 * total / self.rendered:.2f} ms" for name, total in self.stages.items())
+            self.reset(now, capture_seq)
+            return text
+
+class CameraSignals(QObject):
+    status_update = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+    stats_update = pyqtSignal(str)
+    colors_calibrated = pyqtSignal(int)
+    lens_calibrated = pyqtSignal(object)
+    cameras_found = pyqtSignal(list)
+    probe_done = pyqtSignal(int, list)
+    camera_opened = pyqtSignal(int, object)
+    targets_resolved = pyqtSignal(str)
+    playback_stopped = pyqtSignal(str)
+    rois_changed = pyqtSignal()
+    frame_ready = pyqtSignal()
+
+class RemapConfig(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Button Config")
+        self.layout = QVBoxLayout(self)
+        self.formLayout = QFormLayout()
+        
+        def create_combo(setting_key, default_val):
+            cb = QComboBox()
+            items = [("A (bottom)", GamepadButtons.ButtonA), ("B (right)", GamepadButtons.ButtonB),
+                     ("X (left)", GamepadButtons.ButtonX), ("Y (top)", GamepadButtons.ButtonY),
+                     ("Right", GamepadButtons.ButtonRight), ("Left", GamepadButtons.ButtonLeft),
+                     ("Up", GamepadButtons.ButtonUp), ("Down", GamepadButtons.ButtonDown),
+                     ("RB", GamepadButtons.ButtonR1), ("LB", GamepadButtons.ButtonL1),
+                     ("Select", GamepadButtons.ButtonSelect), ("Start", GamepadButtons.ButtonStart),
+                     ("RT", GamepadButtons.ButtonR2), ("LT", GamepadButtons.ButtonL2),
+                     ("L3", GamepadButtons.ButtonL3), ("R3", GamepadButtons.ButtonR3),
+                     ("Guide", GamepadButtons.ButtonGuide), ("None", GamepadButtons.ButtonInvalid)]
+            for text, data in items: cb.addItem(text, data)
+            idx = cb.findData(variant_to_button(state.settings.value(setting_key, default_val)))
+            if idx >= 0: cb.setCurrentIndex(idx)
+            return cb
+
+        self.combos = {
+            "ButtonA": create_combo("ButtonA", GamepadButtons.ButtonA),
+            "ButtonB": create_combo("ButtonB", GamepadButtons.ButtonB),
+            "ButtonX": create_combo("ButtonX", GamepadButtons.ButtonX),
+            "ButtonY": create_combo("ButtonY", GamepadButtons.ButtonY),
+            "ButtonUp": create_combo("ButtonUp", GamepadButtons.ButtonUp),
+            "ButtonDown": create_combo("ButtonDown", GamepadButtons.ButtonDown),
+            "ButtonLeft": create_combo("ButtonLeft", GamepadButtons.ButtonLeft),
+            "ButtonRight": create_combo("ButtonRight", GamepadButtons.ButtonRight),
+            "ButtonL": create_combo("ButtonL", GamepadButtons.ButtonL1),
+            "ButtonR": create_combo("ButtonR", GamepadButtons.ButtonR1),
+            "ButtonSelect": create_combo("ButtonSelect", GamepadButtons.ButtonSelect),
+            "ButtonStart": create_combo("ButtonStart", GamepadButtons.ButtonStart),
+            "ButtonZL": create_combo("ButtonZL", GamepadButtons.ButtonL2),
+            "ButtonZR": create_combo("ButtonZR", GamepadButtons.ButtonR2),
+            "ButtonHome": create_combo("ButtonHome", GamepadButtons.ButtonInvalid),
+            "ButtonPower": create_combo("ButtonPower", GamepadButtons.ButtonInvalid),
+            "ButtonPowerLong": create_combo("ButtonPowerLong", GamepadButtons.ButtonInvalid),
+            "ButtonT1": create_combo("ButtonT1", GamepadButtons.ButtonInvalid),
+            "ButtonT2": create_combo("ButtonT2", GamepadButtons.ButtonInvalid),
+        }
+
+        for label, combo in self.combos.items(): self.formLayout.addRow(label, combo)
+        
+        self.t1x = QLineEdit(str(state.settings.value("touchButton1X", 0)))
+        self.t1y = QLineEdit(str(state.settings.value("touchButton1Y", 0)))
+        self.t2x = QLineEdit(str(state.settings.value("touchButton2X", 0)))
+        self.t2y = QLineEdit(str(state.settings.value("touchButton2Y", 0)))
+        self.formLayout.addRow("T1 X", self.t1x); self.formLayout.addRow("T1 Y", self.t1y)
+        self.formLayout.addRow("T2 X", self.t2x); self.formLayout.addRow("T2 Y", self.t2y)
+
+        self.saveButton = QPushButton("SAVE")
+        self.saveButton.clicked.connect(self.save_settings)
+        self.layout.addLayout(self.formLayout)
+        self.layout.addWidget(self.saveButton)
+
+    def save_settings(self):
+        try: points = [int(edit.text().strip()) for edit in (self.t1x, self.t1y, self.t2x, self.t2y)]
+        except ValueError:
+            QMessageBox.warning(self, "Button Config", "Touch button X and Y must be whole numbers")
+            return
+        for key, combo in self.combos.items(): state.settings.setValue(key, combo.currentData())
+        for key, value in zip(("touchButton1X", "touchButton1Y", "touchButton2X", "touchButton2Y"), points):
+            state.settings.setValue(key, value)
+        rebuild_button_map()
+        self.hide()
+
+def load_camera_mode(index):
+    text = state.settings.value(f"cameraMode{index}", "")
+    try: return tuple(json.loads(text)) if text else None
+    except ValueError: return None
+
+def phash(gray):
+    # 64-bit perceptual hash: signs of the low 8x8 DCT coefficients against their median
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return np.packbits(low > np.median(low))
+
+class ScreenTrigger:
+    # One check on a sub-region of a warped screen, with its template pyramid (or hash) built once at load
+    def __init__(self, spec, base_dir=""):
+        self.name = spec.get("name", "trigger")
+        self.screen = {"top": 0, "bottom": 1}[spec.get("screen", "top")]
+        w, h = (TOP_TARGET, BOTTOM_TARGET)[self.screen]
+        # Clipped to the warped screen here, so check() never slices outside it on the render thread
+        x, y, rw, rh = (int(v) for v in spec.get("region", (0, 0, w, h)))
+        x0, y0, x1, y1 = max(0, x), max(0, y), min(w, x + rw), min(h, y + rh)
+        self.region = (x0, y0, x1 - x0, y1 - y0)
+        self.method = spec.get("method", "template")
+        if self.method not in ("template", "phash"): raise ValueError(f"{self.name}: unknown method {self.method}")
+        self.action = spec.get("action", "wait")
+        if self.action not in TRIGGER_ACTIONS: raise ValueError(f"{self.name}: unknown action {self.action}")
+        self.threshold = spec.get("threshold", 0.9 if self.method == "template" else 10)
+        self.scale = spec.get("scale", TRIGGER_SCALE)
+        if min(self.region[2:]) * self.scale < 1:
+            raise ValueError(f"{self.name}: region {[x, y, rw, rh]} is empty on the {w}x{h} {spec.get('screen', 'top')} screen")
+        # Playback times in seconds; turned into frame indices when playback starts
+        self.times = {key: spec.get(key) for key in ("at", "goto", "from", "to")}
+        if self.action == "wait" and self.times["at"] is None: raise ValueError(f"{self.name}: wait needs 'at'")
+        if self.action == "branch" and self.times["goto"] is None: raise ValueError(f"{self.name}: branch needs 'goto'")
+        self.timeout = spec.get("timeout")
+        self.on_timeout = spec.get("on_timeout", "stop")
+        path = os.path.join(base_dir, spec["template"])
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None: raise ValueError(f"{self.name}: cannot read {path}")
+        image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if self.method == "template" and (image.shape[1] > self.region[2] * self.scale or image.shape[0] > self.region[3] * self.scale):
+            raise ValueError(f"{self.name}: template is larger than its region")
+        self.hash = phash(image) if self.method == "phash" else None
+        self.pyramid = [image]
+        while self.method == "template" and len(self.pyramid) < TRIGGER_LEVELS and min(self.pyramid[-1].shape) >= 16:
+            self.pyramid.append(cv2.pyrDown(self.pyramid[-1]))
+        self.frames = {}
+        self.reset()
+
+    def start(self, tick_rate):
+        self.frames = {key: None if t is None else int(round(t / tick_rate)) for key, t in self.times.items()}
+        self.reset()
+
+    def reset(self):
+        self.matched = False
+        self.score = None
+        self.fired = 0
+        self.held_since = None
+
+    def check(self, screen):
+        x, y, w, h = self.region
+        gray = cv2.cvtColor(screen[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if self.hash is not None:
+            self.score = int(np.unpackbits(phash(gray) ^ self.hash).sum())
+            return self.score <= self.threshold
+        levels = [gray]
+        for _ in range(len(self.pyramid) - 1): levels.append(cv2.pyrDown(levels[-1]))
+        # Coarse to fine: stop as soon as a level is clearly below the threshold
+        for level in range(len(self.pyramid) - 1, -1, -1):
+            region, template = levels[level], self.pyramid[level]
+            if region.shape[0] < template.shape[0] or region.shape[1] < template.shape[1]: return False
+            self.score = float(cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED).max())
+            if self.score < self.threshold - (TRIGGER_SLACK if level else 0): return False
+        return True
+
+class TriggerEngine:
+    # Runs the active triggers round robin on the render thread within TRIGGER_BUDGET per frame and drives
+    # playback through state.play_gates (wait), state.play_hold (pause) and state.play_jump (branch)
+    def __init__(self, on_stop=None):
+        self.triggers = []
+        self.next = 0
+        self.status = ""
+        self.on_stop = on_stop # called (from the render thread) when a timed-out wait stops playback
+
+    def load(self, path):
+        with open(path) as f: specs = json.load(f)
+        base_dir = os.path.dirname(path)
+        self.triggers = [ScreenTrigger(spec, base_dir) for spec in specs]
+        self.next = 0
+
+    def start(self, tick_rate):
+        for t in self.triggers: t.start(tick_rate)
+        self.next = 0
+        self.status = ""
+        return [t.frames["at"] for t in self.triggers if t.action == "wait"]
+
+    def active(self, t, idx):
+        f = t.frames
+        if t.action == "wait": return idx >= f["at"] and f["at"] in state.play_gates
+        return (f["from"] is None or idx >= f["from"]) and (f["to"] is None or idx < f["to"])
+
+    def update(self, warped):
+        idx = state.current_play_idx
+        now = time.perf_counter()
+        deadline = now + TRIGGER_BUDGET
+        n = len(self.triggers)
+        checked = 0
+        for k in range(n):
+            t = self.triggers[(self.next + k) % n]
+            if not self.active(t, idx) or t.screen >= len(warped):
+                t.matched = False
+                continue
+            if checked and time.perf_counter() > deadline:
+                # Out of budget: pick up from here on the next frame
+                self.next = (self.next + k) % n
+                break
+            checked += 1
+            matched = t.check(warped[t.screen])
+            rising = matched and not t.matched
+            t.matched = matched
+            if t.action == "wait":
+                if t.held_since is None: t.held_since = now
+                if matched:
+                    state.play_gates.discard(t.frames["at"])
+                    self.status = f"{t.name}: matched after {now - t.held_since:.1f} s"
+                    t.held_since = None
+                elif t.timeout is not None and now - t.held_since > t.timeout:
+                    self.status = f"{t.name}: timed out ({t.on_timeout})"
+                    t.held_since = None
+                    if t.on_timeout == "continue": state.play_gates.discard(t.frames["at"])
+                    else:
+                        stop_playback()
+                        if self.on_stop: self.on_stop(self.status)
+            elif t.action == "branch" and rising:
+                t.fired += 1
+                state.play_jump = t.frames["goto"]
+                self.status = f"{t.name}: branching to {t.times['goto']} s"
+        state.play_hold = any(t.matched for t in self.triggers if t.action == "pause")
+
+    def summary(self):
+        waiting = [t.name for t in self.triggers if state.is_playing and t.action == "wait" and t.frames
+                   and t.frames["at"] in state.play_gates and state.current_play_idx >= t.frames["at"]]
+        text = f"Triggers: {len(self.triggers)}"
+        if waiting: text += " | waiting for " + ", ".join(waiting)
+        elif state.is_playing and state.play_hold: text += " | paused"
+        if self.status: text += " | " + self.status
+        return text
+
+def cache_path(name):
+    # Next to the settings file, so it follows the same per-user location
+    folder = os.path.dirname(state.settings.fileName())
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+def load_rois():
+    try: return [np.float32(pts).reshape(4, 2) for pts in json.loads(state.settings.value("screens", "") or "[]")]
+    except (ValueError, TypeError): return []
+
+def load_lens():
+    text = state.settings.value("lensCalibration", "")
+    if not text: return None
+    try:
+        data = json.loads(text)
+        return np.array(data["K"], dtype=np.float64), np.array(data["dist"], dtype=np.float64), tuple(data["size"])
+    except (ValueError, KeyError, TypeError): return None
+
+class LensCalibrator:
+    # Collects distinct checkerboard poses from live frames, then solves the intrinsics off the render thread
+    def __init__(self, pattern=LENS_PATTERN):
+        self.pattern = pattern
+        self.grid = np.zeros((pattern[0] * pattern[1], 3), dtype=np.float32)
+        self.grid[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2)
+        self.active = False
+        self.views = []
+        self.count = 0
+        self.signals = None
+
+    def start(self, signals):
+        self.signals = signals
+        self.views = []
+        self.count = 0
+        self.active = True
+
+    def collect(self, frame):
+        self.count += 1
+        if self.count % LENS_INTERVAL: return
+        h, w = frame.shape[:2]
+        scale = min(1.0, LENS_DETECT_WIDTH / w)
+        small = cv2.cvtColor(cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        flags = cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_FAST_CHECK
+        found, corners = cv2.findChessboardCorners(small, self.pattern, flags=flags)
+        if not found: return
+        corners = (corners / scale).reshape(-1, 1, 2).astype(np.float32)
+        if self.views and np.linalg.norm(corners - self.views[-1], axis=-1).mean() < LENS_MIN_SHIFT * w: return
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+        self.views.append(cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria).reshape(-1, 1, 2))
+        self.signals.status_update.emit(f"Lens: show the checkerboard and move it around ({len(self.views)}/{LENS_VIEWS} views)")
+        if len(self.views) >= LENS_VIEWS:
+            self.active = False
+            self.signals.status_update.emit("Lens: solving...")
+            threading.Thread(target=self.solve, args=(list(self.views), (w, h)), daemon=True).start()
+
+    def solve(self, views, size):
+        try:
+            rms, K, dist, _, _ = cv2.calibrateCamera([self.grid] * len(views), views, size, None, None)
+            self.signals.lens_calibrated.emit((K, dist, size, float(rms)))
+        except cv2.error:
+            self.signals.lens_calibrated.emit(None)
+
+def fit_color_lut(captured, reference):
+    # Per channel: the mean reference level seen at each camera level, interpolated over the gaps and kept monotonic
+    captured = cv2.GaussianBlur(np.clip(np.rint(captured), 0, 255).astype(np.uint8), (5, 5), 0)
+    reference = cv2.GaussianBlur(cv2.resize(reference, captured.shape[1::-1], interpolation=cv2.INTER_AREA), (5, 5), 0)
+    levels = np.arange(256)
+    lut = np.empty((1, 256, 3), dtype=np.uint8)
+    for c in range(3):
+        cam = captured[..., c].ravel()
+        counts = np.bincount(cam, minlength=256)
+        sums = np.bincount(cam, weights=reference[..., c].ravel(), minlength=256)
+        valid = counts >= COLOR_MIN_SAMPLES
+        if valid.sum() < 2:
+            lut[0, :, c] = levels
+            continue
+        table = np.maximum.accumulate(np.interp(levels, levels[valid], sums[valid] / counts[valid]))
+        lut[0, :, c] = np.clip(np.rint(table), 0, 255)
+    return lut
+
+class ColorCorrector:
+    # One 256-entry table per channel per screen, applied with cv2.LUT on the warped outputs
+    def __init__(self, screens=2):
+        self.luts = [None] * screens
+        self.outputs = [None] * screens
+        self.references = {}
+        self.sums = {}
+        self.frames = 0
+
+    def calibrate(self, references):
+        self.sums = {}
+        self.frames = 0
+        self.references = dict(references)
+
+    def collect(self, warped):
+        # Average a few frames of the raw warped screens, then fit each screen against its reference
+        if not self.references: return []
+        for i in self.references:
+            if i >= len(warped): return []
+            if i in self.sums: self.sums[i] += warped[i]
+            else: self.sums[i] = warped[i].astype(np.float32)
+        self.frames += 1
+        if self.frames < COLOR_CALIBRATION_FRAMES: return []
+        done = list(self.references)
+        for i in done: self.luts[i] = fit_color_lut(self.sums[i] / self.frames, self.references[i])
+        self.calibrate({})
+        return done
+
+    def apply(self, warped):
+        out = list(warped)
+        for i, img in enumerate(warped):
+            lut = self.luts[i] if i < len(self.luts) else None
+            if lut is not None: out[i] = self.outputs[i] = cv2.LUT(img, lut, dst=self.outputs[i])
+        return out
+
+    def save(self, i):
+        lut = self.luts[i]
+        state.settings.setValue(COLOR_PROFILE_KEYS[i], "" if lut is None else lut.tobytes().hex())
+
+    def load(self):
+        for i, key in enumerate(COLOR_PROFILE_KEYS):
+            text = state.settings.value(key, "")
+            try: self.luts[i] = np.frombuffer(bytes.fromhex(text), dtype=np.uint8).reshape(1, 256, 3) if text else None
+            except ValueError: self.luts[i] = None
+
+class AppWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.signals = CameraSignals()
+        state.settings = QSettings("cylin_TW", "3DSC2")
+        self.setup_variables()
+        self.setup_ui()
+        self.setup_connections()
+        self.update_ip()
+        # Pick up where the last session stopped: reopen its camera straight away, in the background,
+        # while the remaining slots are scanned
+        resume = int(state.settings.value("cameraIndex", 0)) if state.settings.value("cameraRunning", False, type=bool) else None
+        if resume is not None: self.open_camera_async(resume)
+        self.find_cameras(resume)
+        self.gamepad_monitor = GamepadMonitor(self)
+        
+        state.heartbeat_running = True
+        self.heartbeat_thread = threading.Thread(target=heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+
+    def setup_variables(self):
+        self.camera_index = 0
+        self.frame_width = 2560
+        self.frame_height = 1440
+        self.top_target = TOP_TARGET
+        self.bottom_target = BOTTOM_TARGET
+        self.frame_ring = FrameRing()
+        self.display_seq = 0
+        self.running = False
+        self.roi_points = []
+        self.screens = []
+        self.all_points = []
+        self.cap = None
+        self.camera_opening = False
+        self.camera_thread = None
+        self.render_thread = None
+        self.recorder = None
+        self.streamer = None
+        self.windows_created = False
+        self.display_lock = threading.Lock()
+        self.display_pending = None
+        self.screens_lock = threading.Lock()
+        self.highgui_timer = QTimer(self)
+        self.highgui_timer.timeout.connect(self.pump_windows)
+        self.roi_locked = False
+        self.auto_roi_enabled = False
+        self.detector = ScreenDetector()
+        self.denoiser = TemporalDenoiser()
+        self.denoise_enabled = state.settings.value("denoise", False, type=bool)
+        self.render_stats = RenderStats()
+        self.triggers = TriggerEngine(self.signals.playback_stopped.emit)
+        self.lens_calibrator = LensCalibrator()
+        self.colors = ColorCorrector()
+        self.colors.load()
+        self.color_enabled = state.settings.value("colorCorrect", False, type=bool)
+        self.selector_count = 0
+        self.warp_engine = WarpEngine((self.top_target, self.bottom_target))
+        frame_size = state.settings.value("frameSize", "")
+        if frame_size: self.warp_engine.frame_size = tuple(json.loads(frame_size))
+        supersample = int(state.settings.value("supersample", 1))
+        self.warp_engine.set_supersample(supersample if supersample in SUPERSAMPLE_FACTORS else 1)
+        self.warp_engine.set_lens(load_lens(), state.settings.value("undistort", False, type=bool))
+        self.screens = load_rois()
+        self.all_points = [(int(x), int(y)) for pts in self.screens for x, y in pts]
+        self.roi_locked = state.settings.value("lockROI", False, type=bool) and len(self.screens) >= 2
+        if self.screens: self.warp_engine.load_plan(cache_path("warp_plan.npz"), self.screens)
+        
+        self.ip_lock = threading.Lock()
+        self.ip_pending = None
+        state.yAxisMultiplier = -1 if state.settings.value("invertY", False, type=bool) else 1
+        state.abInverse = state.settings.value("invertAB", False, type=bool)    
+        state.xyInverse = state.settings.value("invertXY", False, type=bool)
+        rebuild_button_map()
+        rate_hz = int(state.settings.value("tickRateHz", round(1 / TICK_RATE)))
+        state.tick_rate = 1.0 / (rate_hz if rate_hz in TICK_RATES_HZ else round(1 / TICK_RATE))
+        state.scheduler = TickScheduler(state.tick_rate)
+
+    def setup_ui(self):
+        self.setWindowTitle("3DSC2")
+        self.setMinimumSize(600, 600)
+        central = QWidget()
+        self.setCentralWidget(central)
+        layout = QVBoxLayout(central)
+
+        cam_group = QGroupBox("Camera & Network")
+        cam_layout = QFormLayout(cam_group)
+        self.camera_combo = QComboBox()
+        self.camera_combo.addItem("Searching...")
+        self.camera_combo.setEnabled(False)
+        self.probe_btn = QPushButton("Probe Modes")
+        self.probe_btn.setToolTip("Time every resolution/format/rate the camera offers and keep the fastest for the screens")
+        self.probe_btn.setEnabled(False)
+        camera_row = QHBoxLayout()
+        camera_row.addWidget(self.camera_combo, 1); camera_row.addWidget(self.probe_btn)
+        cam_layout.addRow("Camera:", camera_row)
+        self.ip_edit = QLineEdit(state.settings.value("ipAddress", ""))
+        self.ip_edit.setToolTip("One or more consoles, comma separated: host[:port][@offset_ms]")
+        cam_layout.addRow("3DS IP:", self.ip_edit)
+        layout.addWidget(cam_group)
+
+        btn_layout = QHBoxLayout()
+        self.start_btn = QPushButton("Start Camera")
+        self.start_btn.setEnabled(False)
+        self.stop_btn = QPushButton("Stop Camera")
+        self.stop_btn.setEnabled(False)
+        self.reset_btn = QPushButton("Reset ROIs")
+        self.config_btn = QPushButton("Button Config")
+        self.lock_roi = QCheckBox("Lock ROIs")
+        self.lock_roi.setChecked(self.roi_locked)
+        self.auto_roi = QCheckBox("Auto ROIs")
+        btn_layout.addWidget(self.start_btn); btn_layout.addWidget(self.stop_btn)
+        btn_layout.addWidget(self.reset_btn); btn_layout.addWidget(self.config_btn)
+        btn_layout.addWidget(self.lock_roi); btn_layout.addWidget(self.auto_roi)
+        layout.addLayout(btn_layout)
+
+        tas_group = QGroupBox("Event Replay")
+        tas_layout = QHBoxLayout(tas_group)
+        self.record_btn = QPushButton("Record")
+        self.play_btn = QPushButton("Play")
+        self.save_tas_btn = QPushButton("Save Event")
+        self.load_tas_btn = QPushButton("Load Event")
+        tas_layout.addWidget(self.record_btn); tas_layout.addWidget(self.play_btn)
+        tas_layout.addWidget(self.save_tas_btn); tas_layout.addWidget(self.load_tas_btn)
+        self.tick_combo = QComboBox()
+        for hz in TICK_RATES_HZ: self.tick_combo.addItem(f"{hz} Hz", hz)
+        self.tick_combo.setCurrentIndex(max(0, self.tick_combo.findData(round(1 / state.tick_rate))))
+        tas_layout.addWidget(self.tick_combo)
+        self.triggers_btn = QPushButton("Triggers...")
+        self.triggers_btn.setToolTip("Load screen triggers (JSON) that pause, resume or branch playback; cancel to clear them")
+        self.trigger_label = QLabel("Triggers: none")
+        tas_layout.addWidget(self.triggers_btn); tas_layout.addWidget(self.trigger_label)
+        layout.addWidget(tas_group)
+
+        video_group = QGroupBox("Video")
+        video_layout = QHBoxLayout(video_group)
+        self.video_combo = QComboBox()
+        for text, data in VIDEO_LAYOUTS: self.video_combo.addItem(text, data)
+        self.video_btn = QPushButton("Record Video")
+        self.video_label = QLabel("Video: off")
+        video_layout.addWidget(self.video_combo); video_layout.addWidget(self.video_btn)
+        video_layout.addWidget(self.video_label)
+        self.stream_port = QLineEdit(str(state.settings.value("streamPort", STREAM_PORT)))
+        self.stream_port.setMaximumWidth(60); self.stream_port.setToolTip("HTTP port for the LAN stream")
+        self.stream_btn = QPushButton("Start Stream")
+        self.stream_label = QLabel("Stream: off")
+        video_layout.addWidget(self.stream_port); video_layout.addWidget(self.stream_btn)
+        video_layout.addWidget(self.stream_label)
+        layout.addWidget(video_group)
+
+        inv_layout = QHBoxLayout()
+        self.inv_y = QCheckBox("Invert Y"); self.inv_y.setChecked(state.yAxisMultiplier == -1)
+        self.inv_ab = QCheckBox("Invert A-B"); self.inv_ab.setChecked(state.abInverse)
+        self.inv_xy = QCheckBox("Invert X-Y"); self.inv_xy.setChecked(state.xyInverse)
+        inv_layout.addWidget(self.inv_y); inv_layout.addWidget(self.inv_ab); inv_layout.addWidget(self.inv_xy)
+        layout.addLayout(inv_layout)
+
+        image_group = QGroupBox("Image")
+        image_layout = QHBoxLayout(image_group)
+        self.denoise_check = QCheckBox("Denoise"); self.denoise_check.setChecked(self.denoise_enabled)
+        self.supersample_combo = QComboBox()
+        for n in SUPERSAMPLE_FACTORS: self.supersample_combo.addItem(f"Supersample {n}x", n)
+        self.supersample_combo.setCurrentIndex(max(0, self.supersample_combo.findData(self.warp_engine.supersample)))
+        image_layout.addWidget(self.denoise_check); image_layout.addWidget(self.supersample_combo)
+        self.color_check = QCheckBox("Color Correct"); self.color_check.setChecked(self.color_enabled)
+        self.calibrate_colors_btn = QPushButton("Calibrate Colors")
+        self.calibrate_colors_btn.setToolTip("Show a reference image on the console, then pick the same image for each screen")
+        image_layout.addWidget(self.color_check); image_layout.addWidget(self.calibrate_colors_btn)
+        self.undistort_check = QCheckBox("Undistort"); self.undistort_check.setChecked(self.warp_engine.lens_enabled)
+        self.undistort_check.setEnabled(self.warp_engine.lens is not None)
+        self.calibrate_lens_btn = QPushButton("Calibrate Lens")
+        self.calibrate_lens_btn.setToolTip(f"Show a {LENS_PATTERN[0] + 1}x{LENS_PATTERN[1] + 1} square checkerboard to the camera and move it around")
+        image_layout.addWidget(self.undistort_check); image_layout.addWidget(self.calibrate_lens_btn)
+        layout.addWidget(image_group)
+
+        self.status_label = QLabel("Ready")
+        layout.addWidget(self.status_label)
+        self.instr = QTextEdit("1. Set the IP of your 3DS. 2. Click the start camera. 3. select ROIs (4 pts each screen). 4. Enjoy!")
+        self.instr.setReadOnly(True); self.instr.setMaximumHeight(80)
+        layout.addWidget(self.instr)
+        
+        self.fps_label = QLabel("FPS: --")
+        layout.addWidget(self.fps_label)
+        self.tick_label = QLabel("Ticks: --")
+        layout.addWidget(self.tick_label)
+
+        trace_layout = QHBoxLayout()
+        self.trace_check = QCheckBox("Trace latency")
+        self.dump_trace_btn = QPushButton("Dump Trace")
+        trace_layout.addWidget(self.trace_check); trace_layout.addWidget(self.dump_trace_btn)
+        layout.addLayout(trace_layout)
+        self.latency_label = QLabel("Latency: off")
+        layout.addWidget(self.latency_label)
+        self.targets_label = QLabel("Targets: --")
+        layout.addWidget(self.targets_label)
+        self.latency_lines = []
+        self.tick_stats_timer = QTimer(self)
+        self.tick_stats_timer.timeout.connect(self.update_tick_stats)
+        self.tick_stats_timer.start(1000)
+
+        self.remap_dlg = RemapConfig(self)
+
+    def setup_connections(self):
+        self.start_btn.clicked.connect(self.start_camera)
+        self.stop_btn.clicked.connect(self.stop_camera)
+        self.reset_btn.clicked.connect(self.reset_rois)
+        self.config_btn.clicked.connect(self.remap_dlg.show)
+        # Typing only restarts a short timer; the address is applied once the text settles or editing ends
+        self.ip_timer = QTimer(self)
+        self.ip_timer.setSingleShot(True)
+        self.ip_timer.setInterval(600)
+        self.ip_timer.timeout.connect(self.update_ip)
+        self.ip_edit.textChanged.connect(self.ip_timer.start)
+        self.ip_edit.editingFinished.connect(self.update_ip)
+        self.signals.targets_resolved.connect(lambda t: state.settings.setValue("ipAddress", t))
+        self.inv_y.stateChanged.connect(self.update_settings)
+        self.inv_ab.stateChanged.connect(self.update_settings)
+        self.inv_xy.stateChanged.connect(self.update_settings)
+        self.lock_roi.stateChanged.connect(self.update_roi_lock)
+        self.auto_roi.stateChanged.connect(self.update_auto_roi)
+        self.denoise_check.stateChanged.connect(self.update_filters)
+        self.supersample_combo.currentIndexChanged.connect(self.update_filters)
+        self.color_check.stateChanged.connect(self.update_filters)
+        self.calibrate_colors_btn.clicked.connect(self.calibrate_colors)
+        self.signals.colors_calibrated.connect(self.save_color_profile)
+        self.undistort_check.stateChanged.connect(self.update_filters)
+        self.calibrate_lens_btn.clicked.connect(self.calibrate_lens)
+        self.signals.lens_calibrated.connect(self.save_lens)
+        
+        self.record_btn.clicked.connect(self.toggle_record)
+        self.play_btn.clicked.connect(self.toggle_play)
+        self.signals.playback_stopped.connect(self.playback_stopped)
+        self.save_tas_btn.clicked.connect(self.save_tas)
+        self.load_tas_btn.clicked.connect(self.load_tas)
+        self.tick_combo.currentIndexChanged.connect(self.update_tick_rate)
+        self.trace_check.stateChanged.connect(self.update_tracing)
+        self.dump_trace_btn.clicked.connect(self.dump_trace)
+        self.video_btn.clicked.connect(self.toggle_video)
+
+        self.signals.status_update.connect(self.status_label.setText)
+        self.signals.cameras_found.connect(self.update_cameras)
+        self.signals.probe_done.connect(self.save_camera_mode)
+        self.signals.camera_opened.connect(self.camera_opened)
+        self.signals.rois_changed.connect(self.save_rois)
+        self.signals.frame_ready.connect(self.show_frames)
+        self.probe_btn.clicked.connect(self.probe_modes)
+        self.stream_btn.clicked.connect(self.toggle_stream)
+        self.triggers_btn.clicked.connect(self.load_triggers)
+        self.signals.stats_update.connect(self.fps_label.setText)
+        self.signals.error_occurred.connect(lambda m: QMessageBox.critical(self, "Error", m))
+
+    def update_ip(self):
+        self.ip_timer.stop()
+        text = self.ip_edit.text()
+        if text == state.ipAddress: return
+        self.ip_pending = text
+        threading.Thread(target=self.resolve_targets, daemon=True).start()
+
+    def resolve_targets(self):
+        # Name lookups and connect() can block for seconds, so never on the GUI thread; one at a time, latest text wins.
+        # A half-typed address keeps the previous targets
+        with self.ip_lock:
+            text, self.ip_pending = self.ip_pending, None
+            if text is None: return
+            try: set_targets(text)
+            except (OSError, ValueError) as e:
+                self.signals.status_update.emit(f"3DS address not usable: {e}")
+                return
+        self.signals.targets_resolved.emit(text)
+    
+    def update_settings(self):
+        state.yAxisMultiplier = -1 if self.inv_y.isChecked() else 1
+        state.abInverse = self.inv_ab.isChecked()
+        state.xyInverse = self.inv_xy.isChecked()
+        state.settings.setValue("invertY", self.inv_y.isChecked())
+        state.settings.setValue("invertAB", self.inv_ab.isChecked())
+        state.settings.setValue("invertXY", self.inv_xy.isChecked())
+        rebuild_button_map()
+
+    def update_tick_rate(self):
+        hz = self.tick_combo.currentData()
+        state.settings.setValue("tickRateHz", hz)
+        state.tick_rate = 1.0 / hz
+        if not state.is_playing:
+            state.scheduler.set_period(state.tick_rate)
+            # A full-resolution log renders at whatever rate is picked; a recording in progress renders when it stops
+            if state.input_log is not None and not state.is_recording: state.tas_events = Timeline.from_log(state.input_log).render(state.tick_rate, state.input_log.meta)
+        state.scheduler.reset_stats()
+
+    def update_tick_stats(self):
+        st = state.scheduler.stats()
+        sender = state.sender
+        self.tick_label.setText(f"Ticks: {st['rate_hz']:g} Hz | late avg {st['lateness_mean_us']:.0f} us, "
+                                f"max {st['lateness_max_us']:.0f} us | missed {st['missed']} | "
+                                f"sent {sender.changes} changes, {sender.keepalives} keepalives, {sender.deferred} deferred")
+        self.tick_label.setToolTip("\n".join(f"{k}: {v}" for k, v in st["lateness_histogram"].items()))
+        self.update_latency_stats()
+        self.update_target_stats()
+        self.update_video_stats()
+        self.trigger_label.setText(self.triggers.summary() if self.triggers.triggers else "Triggers: none")
+
+    def update_target_stats(self):
+        stats = state.targets.stats()
+        self.targets_label.setText("Targets: " + (" | ".join(f"{t['target']} sent {t['sent']} err {t['errors']}" for t in stats) or "none"))
+        self.targets_label.setToolTip("\n".join(f"{t['target']}: {t['last_error']}" for t in stats if t["last_error"]))
+
+    def update_tracing(self):
+        state.tracer.clear()
+        state.tracer.enabled = self.trace_check.isChecked()
+        if not state.tracer.enabled:
+            self.latency_lines = []
+            self.latency_label.setText("Latency: off")
+
+    def update_latency_stats(self):
+        if not state.tracer.enabled: return
+        pct = state.tracer.percentiles()
+        self.latency_lines = [f"{stage:6s} p50 {p['p50_ms']:6.2f} p99 {p['p99_ms']:6.2f} ms" for stage, p in pct.items()]
+        total = pct.get("total")
+        self.latency_label.setText(f"Latency: input->send p50 {total['p50_ms']:.2f} ms, p99 {total['p99_ms']:.2f} ms"
+                                   if total else "Latency: waiting for input")
+        self.latency_label.setToolTip("\n".join(self.latency_lines))
+
+    def dump_trace(self):
+        if not state.tracer.trace:
+            self.signals.error_occurred.emit("No latency trace recorded")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Trace", "", "Chrome Trace (*.json)")
+        if path:
+            state.tracer.dump_trace(path)
+            self.signals.status_update.emit(f"Trace saved ({len(state.tracer.trace)} spans)")
+
+    def update_filters(self):
+        self.denoise_enabled = self.denoise_check.isChecked()
+        supersample = self.supersample_combo.currentData()
+        if supersample != self.warp_engine.supersample: self.warp_engine.set_supersample(supersample)
+        state.settings.setValue("denoise", self.denoise_enabled)
+        state.settings.setValue("supersample", supersample)
+        self.color_enabled = self.color_check.isChecked()
+        state.settings.setValue("colorCorrect", self.color_enabled)
+        undistort = self.undistort_check.isChecked()
+        if undistort != self.warp_engine.lens_enabled: self.warp_engine.set_lens(self.warp_engine.lens, undistort)
+        state.settings.setValue("undistort", undistort)
+
+    def calibrate_lens(self):
+        if not self.running:
+            self.signals.error_occurred.emit("Start the camera first")
+            return
+        self.lens_calibrator.start(self.signals)
+        self.signals.status_update.emit(f"Lens: show the checkerboard and move it around (0/{LENS_VIEWS} views)")
+
+    def save_lens(self, result):
+        if result is None:
+            self.signals.error_occurred.emit("Lens calibration failed, try again with more varied poses")
+            return
+        K, dist, size, rms = result
+        state.settings.setValue("lensCalibration", json.dumps({"K": K.tolist(), "dist": np.ravel(dist).tolist(), "size": list(size), "rms": rms}))
+        self.warp_engine.set_lens((K, dist, size), True)
+        self.undistort_check.setEnabled(True); self.undistort_check.setChecked(True)
+        self.signals.status_update.emit(f"Lens calibrated (reprojection error {rms:.2f} px)")
+
+    def calibrate_colors(self):
+        if not self.running or len(self.screens) < 2:
+            self.signals.error_occurred.emit("Start the camera and select both screens first")
+            return
+        references = {}
+        for i, name in enumerate(("Top Screen", "Bottom Screen")):
+            path, _ = QFileDialog.getOpenFileName(self, f"Reference Image for {name}", "", "Images (*.png *.jpg *.bmp)")
+            if not path: continue
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                self.signals.error_occurred.emit(f"Could not read {path}")
+                return
+            references[i] = image
+        if references:
+            self.colors.calibrate(references)
+            self.signals.status_update.emit("Calibrating colors...")
+
+    def save_color_profile(self, i):
+        self.colors.save(i)
+        self.color_check.setChecked(True)
+        self.signals.status_update.emit(f"Color profile saved for the {('top', 'bottom')[i]} screen")
+
+    def update_auto_roi(self):
+        self.detector.reset()
+        self.auto_roi_enabled = self.auto_roi.isChecked()
+        if self.auto_roi_enabled: self.signals.status_update.emit("Looking for the screens...")
+
+    def apply_detected_screens(self, corners):
+        with self.screens_lock:
+            self.roi_points = []
+            self.screens = [c.copy() for c in corners]
+            self.all_points = [(int(x), int(y)) for c in corners for x, y in c]
+            self.warp_engine.set_screens(self.screens)
+
+    def update_roi_lock(self):
+        self.roi_locked = self.lock_roi.isChecked()
+        self.selector_count = 0
+        if self.roi_locked and len(self.screens) < 2:
+            self.signals.status_update.emit("ROIs will lock once both screens are selected")
+        self.save_rois()
+
+    def save_rois(self):
+        # ROIs, the camera size they were picked at and the maps built from them, so the next launch warps from the first frame
+        with self.screens_lock: screens = [pts.tolist() for pts in self.screens]
+        state.settings.setValue("screens", json.dumps(screens))
+        state.settings.setValue("lockROI", self.roi_locked)
+        if self.warp_engine.frame_size: state.settings.setValue("frameSize", json.dumps(list(self.warp_engine.frame_size)))
+        try: self.warp_engine.save_plan(cache_path("warp_plan.npz"))
+        except OSError: pass
+
+    def toggle_video(self):
+        if self.recorder is None:
+            path, _ = QFileDialog.getSaveFileName(self, "Save Video", "", "Video Files (*.mp4 *.avi)")
+            if not path: return
+            try: self.recorder = ScreenRecorder(path, self.video_combo.currentData())
+            except OSError as e:
+                self.signals.error_occurred.emit(str(e))
+                return
+            self.video_btn.setText("Stop Video"); self.video_combo.setEnabled(False)
+        else:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+            self.video_btn.setText("Record Video"); self.video_combo.setEnabled(True)
+            self.signals.status_update.emit(f"Video saved: {recorder.written} frames, {recorder.dropped} dropped")
+
+    def update_video_stats(self):
+        recorder = self.recorder
+        if recorder is None: self.video_label.setText("Video: off")
+        else: self.video_label.setText(f"Video: {recorder.written} frames, {recorder.dropped} dropped")
+        streamer = self.streamer
+        if streamer is None: self.stream_label.setText("Stream: off")
+        else:
+            st = streamer.stats()
+            self.stream_label.setText(f"Stream :{streamer.port} {st['clients']} viewers, {st['encoded']} encoded, {st['skipped']} skipped")
+
+    def toggle_stream(self):
+        if self.streamer is None:
+            try: port = int(self.stream_port.text())
+            except ValueError:
+                self.signals.error_occurred.emit("Stream port must be a number")
+                return
+            try: self.streamer = ScreenStreamer(port=port, layout=self.video_combo.currentData())
+            except OSError as e:
+                self.signals.error_occurred.emit(f"Cannot start stream on port {port}: {e}")
+                return
+            state.settings.setValue("streamPort", port)
+            self.stream_btn.setText("Stop Stream"); self.stream_port.setEnabled(False)
+            self.signals.status_update.emit(f"Streaming on http://<this machine>:{self.streamer.port}/")
+        else:
+            streamer, self.streamer = self.streamer, None
+            streamer.close()
+            self.stream_btn.setText("Start Stream"); self.stream_port.setEnabled(True)
+        self.update_video_stats()
+
+    def toggle_record(self):
+        if not state.is_recording:
+            now = time.perf_counter()
+            # Lets recorded video frames (see ScreenRecorder) be lined up with the input log
+            log = InputLog(meta={"started": {"perf_counter": now, "unix": time.time()}})
+            packet = get_packet_data()
+            if packet: log.record(now, packet)
+            state.input_log = log
+            state.is_recording = True
+            self.record_btn.setText("Stop Recording")
+            self.signals.status_update.emit("Recording...")
+        else:
+            state.is_recording = False
+            log = state.input_log
+            log.record(time.perf_counter(), get_release_packet())
+            # Heartbeat tick timing while recording, kept with the log and every file rendered from it
+            log.meta["timing"] = state.scheduler.stats()
+            state.tas_events = Timeline.from_log(log).render(state.tick_rate, log.meta)
+            self.record_btn.setText("Record")
+            self.signals.status_update.emit(f"Recorded {len(log)} input changes ({len(state.tas_events)} frames at {round(1 / state.tick_rate)} Hz)")
+
+    def toggle_play(self):
+        if not state.tas_events:
+            self.signals.error_occurred.emit("No TAS data loaded")
+            return
+        if not state.is_playing:
+            start_playback(state.tas_events, self.triggers.start(state.tas_events.tick_rate))
+            self.play_btn.setText("Stop Playback")
+            self.signals.status_update.emit("Playing...")
+        else:
+            stop_playback()
+            self.play_btn.setText("Play")
+            self.signals.status_update.emit("Playback stopped")
+
+    def playback_stopped(self, reason):
+        self.play_btn.setText("Play")
+        self.signals.status_update.emit(f"Playback stopped: {reason}")
+
+    def load_triggers(self):
+        if state.is_playing:
+            self.signals.error_occurred.emit("Stop playback before changing triggers")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Load Triggers", "", "Trigger Files (*.json)")
+        if not path:
+            self.triggers.triggers = []
+            self.signals.status_update.emit("Triggers cleared")
+            return
+        try: self.triggers.load(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.triggers.triggers = []
+            self.signals.error_occurred.emit(f"Cannot load triggers: {e}")
+            return
+        self.signals.status_update.emit(f"Loaded {len(self.triggers.triggers)} triggers")
+
+    def save_tas(self):
+        if not state.tas_events: return
+        path, _ = QFileDialog.getSaveFileName(self, "Save TAS", "", "Event Files (*.bin);;Input Logs (*.log)")
+        if not path: return
+        if path.endswith(".log"):
+            if state.input_log is None:
+                self.signals.error_occurred.emit("Only recordings and loaded input logs can be saved as a log")
+                return
+            save_log(path, state.input_log)
+        else: save_events(path, state.tas_events)
+
+    def load_tas(self):
+        if state.is_playing:
+            self.signals.error_occurred.emit("Stop playback before loading another file")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Load TAS", "", "Event Files (*.bin);;Input Logs (*.log);;Legacy JSON Files (*.json)")
+        if path:
+            try:
+                input_log = load_log(path) if path.endswith(".log") else None
+                events = (Timeline.from_log(input_log).render(state.tick_rate, input_log.meta)
+                          if input_log is not None else load_events(path))
+            except (OSError, ValueError) as e:
+                self.signals.error_occurred.emit(f"Cannot load event file: {e}")
+                return
+            # Drop the finished player first, it holds views of the previous file's mapping
+            previous, state.tas_player = state.tas_events, None
+            state.input_log, state.tas_events = input_log, events
+            if previous is not None: previous.close()
+            self.signals.status_update.emit(f"Loaded {len(state.tas_events)} frames")
+
+    def camera_worker(self):
+        try: self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except: pass
+        while self.running:
+            idx = self.frame_ring.acquire()
+            if idx is None: time.sleep(0.001); continue
+            ret, frame = self.cap.read(image=self.frame_ring.slots[idx])
+            if not ret: time.sleep(0.01); continue
+            self.frame_ring.publish(idx, frame)
+
+    def render_worker(self):
+        # Warps and filters off the GUI thread; the finished screens go to show_frames, which does the highgui calls
+        self.render_stats.reset(time.perf_counter(), self.frame_ring.seq)
+        while self.running:
+            borrowed = self.frame_ring.wait(self.display_seq, timeout=0.05)
+            if borrowed is None: continue
+            # Always jump to the newest frame; anything published in between is dropped
+            idx, seq, frame, stamp = borrowed
+            skipped = max(0, seq - self.display_seq - 1) if self.display_seq else 0
+            self.display_seq = seq
+            try: warped = self.update_display(frame, stamp)
+            except Exception as e:
+                # One bad frame (a filter, a trigger, a recorder) must not take the display down with it
+                self.frame_ring.release(idx)
+                traceback.print_exc()
+                self.signals.status_update.emit(f"Render error: {e}")
+                continue
+            self.post_frames(idx, frame, stamp, skipped, warped, self.selector_due())
+
+    def post_frames(self, idx, frame, stamp, skipped, warped, selector):
+        # The camera frame stays borrowed from the ring until show_frames is done with it, so the selector needs no copy.
+        # Only the newest batch is kept; one the GUI thread never picked up is released and counted as dropped
+        batch = [idx, frame, stamp, skipped, [w.copy() for w in warped], selector]
+        with self.display_lock:
+            replaced, self.display_pending = self.display_pending, batch
+        if replaced is None: self.signals.frame_ready.emit()
+        else:
+            self.frame_ring.release(replaced[0])
+            batch[3] += replaced[3] + 1
+
+    def show_frames(self):
+        with self.display_lock: pending, self.display_pending = self.display_pending, None
+        if pending is None: return
+        idx, frame, stamp, skipped, warped, selector = pending
+        try:
+            if not self.running: return
+            self.create_opencv_windows()
+            if len(warped) >= 1: cv2.imshow("Top Screen", warped[0])
+            if len(warped) >= 2: cv2.imshow("Bottom Screen", warped[1])
+            if selector: self.show_selector(frame)
+        finally: self.frame_ring.release(idx)
+        cv2.waitKey(1)
+        now = time.perf_counter()
+        stats = self.render_stats
+        stats.frame(skipped, now - stamp)
+        text = stats.report(now, self.frame_ring.seq)
+        if text: self.signals.stats_update.emit(text)
+
+    def pump_windows(self):
+        # Mouse callbacks and window resizes are delivered from waitKey, even while no new frame arrives
+        if self.windows_created: cv2.waitKey(1)
+
+    def create_opencv_windows(self):
+        if not self.windows_created:
+            cv2.namedWindow("ROI Selector", cv2.WINDOW_NORMAL)
+            cv2.setMouseCallback("ROI Selector", self.mouse_roi_callback)
+            
+            # Create resizable windows
+            cv2.namedWindow("Top Screen", cv2.WINDOW_NORMAL)
+            cv2.namedWindow("Bottom Screen", cv2.WINDOW_NORMAL)
+            cv2.setMouseCallback("Bottom Screen", self.mouse_touch_callback)
+            
+            # Set initial default sizes
+            cv2.resizeWindow("Top Screen", *self.top_target)
+            cv2.resizeWindow("Bottom Screen", *self.bottom_target)
+            self.windows_created = True
+
+    def mouse_roi_callback(self, event, x, y, flags, param):
+        if self.roi_locked or self.auto_roi_enabled: return
+        if event == cv2.EVENT_LBUTTONDOWN:
+            with self.screens_lock:
+                self.roi_points.append([x, y])
+                self.all_points.append((x, y))
+                if len(self.roi_points) < 4: return
+                self.screens.append(np.array(self.roi_points, dtype=np.float32).reshape(4, 2))
+                self.roi_points = []
+                self.warp_engine.set_screens(self.screens)
+            self.signals.status_update.emit(f"ROI {len(self.screens)} selected")
+            self.signals.rois_changed.emit()
+
+    def mouse_touch_callback(self, event, x, y, flags, param):
+        t_input = time.perf_counter()
+        # Dynamically scale window coordinates to 320x240 for 3DS packet
+        try:
+            rect = cv2.getWindowImageRect("Bottom Screen")
+            if rect and rect[2] > 0 and rect[3] > 0:
+                win_w, win_h = rect[2], rect[3]
+                scaled_x = int(x * (TOUCH_SCREEN_WIDTH / win_w))
+                scaled_y = int(y * (TOUCH_SCREEN_HEIGHT / win_h))
+            else:
+                scaled_x, scaled_y = x, y
+        except:
+            scaled_x, scaled_y = x, y
+
+        if event == cv2.EVENT_LBUTTONDOWN:
+            state.touch = TouchSnapshot(True, (scaled_x, scaled_y))
+        elif event == cv2.EVENT_MOUSEMOVE and (flags & cv2.EVENT_FLAG_LBUTTON):
+            state.touch = TouchSnapshot(state.touch.pressed, (scaled_x, scaled_y))
+        elif event == cv2.EVENT_LBUTTONUP:
+            state.touch = TouchSnapshot(False, state.touch.position)
+        else:
+            return
+        input_changed("mouse", t_input)
+
+    def find_cameras(self, active=None):
+        threading.Thread(target=lambda: self.signals.cameras_found.emit(list_cameras(active=active)), daemon=True).start()
+
+    def update_cameras(self, found):
+        self.camera_combo.clear()
+        for i in found: self.camera_combo.addItem(f"Camera {i}", i)
+        if not found: self.camera_combo.addItem("No camera found")
+        self.camera_combo.setCurrentIndex(max(0, self.camera_combo.findData(int(state.settings.value("cameraIndex", 0)))))
+        self.camera_combo.setEnabled(bool(found))
+        self.probe_btn.setEnabled(bool(found))
+        self.start_btn.setEnabled(bool(found) and not self.running and not self.camera_opening)
+
+    def probe_modes(self):
+        idx = self.camera_combo.currentData()
+        if idx is None: return
+        if self.running:
+            self.signals.error_occurred.emit("Stop the camera before probing its modes")
+            return
+        frame_size = self.warp_engine.frame_size
+        if len(self.screens) >= 2 and frame_size:
+            roi_fraction = sum(cv2.contourArea(pts) for pts in self.screens) / (frame_size[0] * frame_size[1])
+        else: roi_fraction = DEFAULT_ROI_FRACTION
+        target_pixels = sum(w * h for w, h in self.warp_engine.targets) * self.warp_engine.supersample ** 2
+        self.probe_btn.setEnabled(False); self.start_btn.setEnabled(False)
+        threading.Thread(target=lambda: self.signals.probe_done.emit(
+            idx, probe_camera(idx, roi_fraction, target_pixels, self.signals.status_update.emit)), daemon=True).start()
+
+    def save_camera_mode(self, idx, results):
+        self.probe_btn.setEnabled(True); self.start_btn.setEnabled(True)
+        if not results:
+            self.signals.error_occurred.emit(f"Camera {idx} did not deliver frames in any mode")
+            return
+        best = results[0]
+        # Reopen with the request that won: some drivers report a nominal rate lower than what they deliver
+        state.settings.setValue(f"cameraMode{idx}", json.dumps(list(best["request"])))
+        self.camera_combo.setToolTip("\n".join(f"{mode_text(r['mode'])}: {r['fps']} fps" for r in results))
+        self.signals.status_update.emit(f"Camera {idx}: {mode_text(best['mode'])}, {best['fps']} fps measured")
+
+    def start_camera(self):
+        idx = self.camera_combo.currentData()
+        if idx is not None: self.open_camera_async(idx)
+
+    def open_camera_async(self, idx):
+        # Opening a camera and setting its mode can take a second; the UI stays responsive meanwhile
+        if self.running or self.camera_opening: return
+        self.camera_opening = True
+        self.start_btn.setEnabled(False)
+        mode = load_camera_mode(idx) or (self.frame_width, self.frame_height, None, None)
+        self.signals.status_update.emit(f"Opening camera {idx}...")
+        threading.Thread(target=lambda: self.signals.camera_opened.emit(idx, open_camera(idx, mode)), daemon=True).start()
+
+    def camera_opened(self, idx, cap):
+        self.camera_opening = False
+        if not cap.isOpened():
+            self.start_btn.setEnabled(self.camera_combo.currentData() is not None)
+            self.signals.error_occurred.emit("Cannot open camera")
+            return
+        self.cap = cap
+        state.settings.setValue("cameraIndex", idx)
+        self.signals.status_update.emit(f"Camera {idx}: {mode_text(camera_mode(self.cap))}")
+        self.running = True
+        self.camera_thread = threading.Thread(target=self.camera_worker, daemon=True)
+        self.camera_thread.start()
+        self.render_thread = threading.Thread(target=self.render_worker, daemon=True)
+        self.render_thread.start()
+        self.highgui_timer.start(30)
+        self.start_btn.setEnabled(False); self.stop_btn.setEnabled(True)
+
+    def stop_camera(self):
+        self.running = False
+        if self.camera_thread: self.camera_thread.join(timeout=1.0)
+        if self.render_thread: self.render_thread.join(timeout=1.0)
+        if self.cap: self.cap.release()
+        self.highgui_timer.stop()
+        with self.display_lock: pending, self.display_pending = self.display_pending, None
+        if pending is not None: self.frame_ring.release(pending[0])
+        if self.windows_created: cv2.destroyAllWindows(); self.windows_created = False
+        self.start_btn.setEnabled(True); self.stop_btn.setEnabled(False)
+
+    def reset_rois(self):
+        self.lock_roi.setChecked(False)
+        with self.screens_lock:
+            self.screens = []; self.all_points = []; self.roi_points = []
+            self.detector.reset()
+            self.warp_engine.set_screens(self.screens)
+        self.save_rois()
+
+    def update_display(self, frame, stamp):
+        stats = self.render_stats
+        t0 = time.perf_counter()
+        self.warp_engine.fit_frame(frame.shape[1::-1])
+        if self.lens_calibrator.active: self.lens_calibrator.collect(frame)
+        if self.auto_roi_enabled:
+            corners = self.detector.update(frame)
+            if corners is not None: self.apply_detected_screens(corners)
+            t1 = time.perf_counter(); stats.stage("track", t1 - t0); t0 = t1
+        warped = self.warp_to_target(frame)
+        t1 = time.perf_counter(); stats.stage("warp", t1 - t0); t0 = t1
+        if self.denoise_enabled and warped:
+            warped = self.denoiser.apply(warped)
+            t1 = time.perf_counter(); stats.stage("denoise", t1 - t0); t0 = t1
+        for i in self.colors.collect(warped): self.signals.colors_calibrated.emit(i)
+        if self.color_enabled and warped:
+            warped = self.colors.apply(warped)
+            t1 = time.perf_counter(); stats.stage("color", t1 - t0); t0 = t1
+        if state.is_playing and self.triggers.triggers and warped:
+            self.triggers.update(warped)
+            t1 = time.perf_counter(); stats.stage("triggers", t1 - t0); t0 = t1
+        recorder = self.recorder
+        if recorder is not None and warped: recorder.submit(warped, stamp)
+        streamer = self.streamer
+        if streamer is not None and warped: streamer.submit(warped, stamp)
+        lines = self.latency_lines
+        if lines and warped:
+            for i, line in enumerate(lines):
+                cv2.putText(warped[0], line, (4, 14 + 14 * i), cv2.FONT_HERSHEY_PLAIN, 0.9, (0, 255, 255), 1)
+        return warped
+
+    def selector_due(self):
+        if self.roi_locked and len(self.screens) >= 2:
+            # ROIs are fixed, so the full frame is only a preview: small and infrequent
+            self.selector_count += 1
+            return self.selector_count % SELECTOR_INTERVAL == 1
+        return True
+
+    def show_selector(self, frame):
+        with self.screens_lock:
+            if self.roi_locked and len(self.screens) >= 2:
+                preview = cv2.resize(frame, None, fx=SELECTOR_SCALE, fy=SELECTOR_SCALE, interpolation=cv2.INTER_NEAREST)
+                x0, y0, x1, y1 = (int(v * SELECTOR_SCALE) for v in roi_bbox(self.screens))
+                cv2.rectangle(preview, (x0, y0), (x1, y1), (0, 255, 0), 1)
+                cv2.imshow("ROI Selector", preview)
+                return
+            # The frame goes back to the camera right after this, so the overlay is drawn on it directly
+            for pt in self.all_points: cv2.circle(frame, pt, 6, (0, 255, 0), -1)
+            for i in range(1, len(self.roi_points)):
+                cv2.line(frame, tuple(self.roi_points[i-1]), tuple(self.roi_points[i]), (255, 255, 0), 2)
+        cv2.imshow("ROI Selector", frame)
+
+    def warp_to_target(self, image):
+        return self.warp_engine.warp(image)
+
+    def closeEvent(self, e): 
+        state.is_playing = False
+        state.heartbeat_running = False
+        self.gamepad_monitor.stop()
+        state.settings.setValue("cameraRunning", self.running or self.camera_opening)
+        self.stop_camera()
+        self.save_rois()
+        if self.recorder is not None: self.recorder.close()
+        if self.streamer is not None: self.streamer.close()
+        e.accept()
+
+def main():
+    app = QApplication(sys.argv)
+    style = """
+    QWidget { background-color: #1e1e1e; color: #e0e0e0; font-family: sans-serif; }
+    QLineEdit, QComboBox, QTextEdit { background-color: #2d2d2d; border: 1px solid #3d3d3d; border-radius: 4px; color: #fff; padding: 4px; }
+    QPushButton { background-color: #333; border: 1px solid #444; border-radius: 6px; padding: 8px; color: #fff; font-weight: bold; }
+    QPushButton:hover { background-color: #444; }
+    QGroupBox { border: 1px solid #444; margin-top: 15px; font-weight: bold; padding-top: 20px; }
+    QGroupBox::title { subcontrol-origin: margin; left: 10px; padding: 0 5px; color: #aaa; }
+    """
+    app.setStyleSheet(style)
+    win = AppWindow()
+    win.show()
+    return app.exec()
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
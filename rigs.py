@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import cv2
+import numpy as np
+from vision import TOP_TARGET, BOTTOM_TARGET, WarpEngine, ScreenDetector, ScreenStreamer, open_camera
+
+RIG_SLOTS = 2 # shared frame slots per rig: the one being written and the newest, which readers copy under the lock
+RIG_STATS = ("pid", "frames", "fps", "latency_ms", "proc_ms", "busy", "beat", "play_idx")
+RIG_STATS_INTERVAL = 0.5 # seconds between a worker's stats updates
+RIG_STALL = 2.0 # no stats update for this long and the rig is reported as stalled
+RIG_RESTART_DELAY = 2.0 # wait before restarting a worker that exited
+RIG_POLL = 0.002 # forwarder sleep while a rig has no new frame
+RIG_DEFAULT_MODE = (1920, 1080, None, None)
+RIG_STAMP_SLACK = 1.0 # a driver timestamp further than this from now is not on the monotonic clock
+
+class RigFrames:
+    # One rig's warped screens in shared memory. Header: newest slot and its seq, then the stats as float64. The writer
+    # fills the other slot unlocked; publishing it and copying the newest out both hold the rig's lock, which also
+    # orders the pixel stores against the header on weakly ordered CPUs
+    def __init__(self, targets=(TOP_TARGET, BOTTOM_TARGET), name=None, lock=None):
+        self.shapes = [(h, w, 3) for w, h in targets]
+        self.lock = lock
+        slot_bytes = sum(int(np.prod(s)) for s in self.shapes)
+        header = 8 * (2 + len(RIG_STATS))
+        self.shm = SharedMemory(name=name, create=name is None, size=header + RIG_SLOTS * slot_bytes)
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self.header = np.ndarray(2, np.int64, buf)
+        self.stats = np.ndarray(len(RIG_STATS), np.float64, buf, offset=16)
+        self.slots = []
+        for i in range(RIG_SLOTS):
+            offset, views = header + i * slot_bytes, []
+            for shape in self.shapes:
+                views.append(np.ndarray(shape, np.uint8, buf, offset=offset))
+                offset += int(np.prod(shape))
+            self.slots.append(views)
+        if name is None: self.header[:] = 0; self.stats[:] = 0
+
+    def begin(self):
+        # Only the writer moves the newest slot, so it can pick the other one without the lock
+        slot = (int(self.header[0]) + 1) % RIG_SLOTS
+        return slot, self.slots[slot]
+
+    def commit(self, slot):
+        with self.lock:
+            self.header[0] = slot
+            self.header[1] += 1
+
+    def read(self, after_seq, out):
+        # Copying under the lock keeps the writer from publishing, and so from reusing this slot, mid-copy
+        with self.lock:
+            slot, seq = int(self.header[0]), int(self.header[1])
+            if seq <= after_seq: return None
+            for dst, src in zip(out, self.slots[slot]): np.copyto(dst, src)
+        return seq
+
+    def stat(self, key):
+        return float(self.stats[RIG_STATS.index(key)])
+
+    def close(self, unlink=False):
+        self.header = self.stats = self.slots = None
+        self.shm.close()
+        if unlink: self.shm.unlink()
+
+def start_control(spec):
+    # Each worker process has its own control state, so rigs replay and send independently
+    import control
+    from control import state
+    control.set_targets(spec["ip"])
+    state.button_map = control.compile_button_map(control.DefaultSettings())
+    if spec.get("rate"): state.tick_rate = 1.0 / spec["rate"]
+    state.scheduler = control.TickScheduler(state.tick_rate)
+    state.heartbeat_running = True
+    if spec.get("replay"): control.start_playback(control.load_events(spec["replay"], state.tick_rate if spec.get("rate") else None))
+    threading.Thread(target=control.heartbeat_loop, daemon=True).start()
+    return state
+
+def capture_time(cap, camera, t_read):
+    # V4L2 stamps each buffer (CLOCK_MONOTONIC, which time.monotonic reads) when the frame was captured, so time it
+    # spent queued in the driver counts. Video files and backends without such stamps fall back to when read() returned
+    if isinstance(camera, str): return t_read
+    t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1e3
+    return t if 0 <= t_read - t < RIG_STAMP_SLACK else t_read
+
+def rig_worker(spec, shm_name, lock, stop):
+    cv2.setNumThreads(1) # one process per rig already spreads over the cores; OpenCV's pool would oversubscribe them
+    frames = RigFrames(name=shm_name, lock=lock)
+    stats = frames.stats
+    stats[RIG_STATS.index("pid")] = os.getpid()
+    engine = WarpEngine()
+    engine.set_supersample(spec.get("supersample", 1))
+    screens = [np.float32(pts).reshape(4, 2) for pts in spec.get("screens", ())]
+    # Without saved ROIs the rig finds its screens itself, like Auto ROIs
+    detector = ScreenDetector() if len(screens) < 2 else None
+    engine.set_screens(screens)
+    control_state = start_control(spec) if spec.get("ip") else None
+    camera = spec.get("camera", 0)
+    cap = open_camera(camera, tuple(spec.get("mode") or RIG_DEFAULT_MODE))
+    if not cap.isOpened(): sys.exit(f"{spec['name']}: cannot open camera {camera}")
+    frame, count, busy, latency, window_start = None, 0, 0.0, 0.0, time.perf_counter()
+    try:
+        while not stop.is_set():
+            ret, frame = cap.read(image=frame)
+            t0, t_read = time.perf_counter(), time.monotonic()
+            if not ret:
+                # Recorded footage loops; a live camera just gets another try
+                if isinstance(camera, str): cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                else: time.sleep(0.01)
+                continue
+            if detector is not None:
+                corners = detector.update(frame)
+                if corners is not None: engine.set_screens(corners)
+            # Warp straight into the shared slot: the UI or streamer reads it without a pickle or an extra copy
+            slot, views = frames.begin()
+            engine.outputs[:len(views)] = views
+            warped = engine.warp(frame)
+            if len(warped) == len(views):
+                for dst, src in zip(views, warped):
+                    if src is not dst: np.copyto(dst, src)
+                frames.commit(slot)
+                latency += time.monotonic() - capture_time(cap, camera, t_read)
+                count += 1
+            now = time.perf_counter()
+            busy += now - t0
+            if now - window_start >= RIG_STATS_INTERVAL:
+                elapsed = now - window_start
+                committed = count - stats[RIG_STATS.index("frames")]
+                stats[RIG_STATS.index("fps")] = committed / elapsed
+                stats[RIG_STATS.index("latency_ms")] = latency / max(committed, 1) * 1e3 # capture to shared slot
+                stats[RIG_STATS.index("proc_ms")] = busy / max(committed, 1) * 1e3 # work per frame after the read
+                stats[RIG_STATS.index("busy")] = busy / elapsed
+                stats[RIG_STATS.index("frames")] = count
+                stats[RIG_STATS.index("play_idx")] = control_state.current_play_idx if control_state else 0
+                stats[RIG_STATS.index("beat")] = time.time()
+                busy, latency, window_start = 0.0, 0.0, now
+    finally:
+        cap.release()
+        if control_state is not None: control_state.heartbeat_running = False
+        frames.close()
+
+class Rig:
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec["name"]
+        self.frames = RigFrames()
+        self.process = None
+        self.restarts = 0
+        self.exited_at = None
+        self.streamer = None
+
+class RigSupervisor:
+    # One worker process per rig (capture, warp and control each on their own GIL); this process only watches them
+    # and forwards their shared frames to the stream layer
+    def __init__(self, specs, stream_port=None):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.stop = self.ctx.Event()
+        self.rigs = [Rig(spec) for spec in specs]
+        self.started = time.time()
+        for i, rig in enumerate(self.rigs):
+            port = rig.spec.get("stream_port", stream_port + i if stream_port is not None else None)
+            if port is not None:
+                rig.streamer = ScreenStreamer(port=port)
+                threading.Thread(target=self.forward, args=(rig,), daemon=True).start()
+            self.launch(rig)
+
+    def launch(self, rig):
+        rig.frames.stats[:] = 0
+        rig.exited_at = None
+        # A fresh lock per launch: a worker killed mid-commit would otherwise leave the old one held for good
+        rig.frames.lock = self.ctx.Lock()
+        rig.process = self.ctx.Process(target=rig_worker, args=(rig.spec, rig.frames.name, rig.frames.lock, self.stop),
+                                       name=f"rig-{rig.name}", daemon=True)
+        rig.process.start()
+
+    def forward(self, rig):
+        seq, buf = 0, [np.empty(shape, np.uint8) for shape in rig.frames.shapes]
+        interval = rig.streamer.interval
+        while not self.stop.is_set():
+            got = rig.frames.read(seq, buf)
+            if got is None: time.sleep(RIG_POLL); continue
+            seq = got
+            rig.streamer.submit(buf)
+            time.sleep(interval) # the streamer encodes at most this often; no point copying faster
+
+    def health(self, rig, now):
+        code = rig.process.exitcode
+        if code is not None: return f"exited ({code})"
+        beat = rig.frames.stat("beat")
+        if not beat: return "starting"
+        return "ok" if now - beat < RIG_STALL else "stalled"
+
+    def poll(self):
+        now, report = time.time(), []
+        for rig in self.rigs:
+            status = self.health(rig, now)
+            if rig.process.exitcode is not None and not self.stop.is_set():
+                if rig.exited_at is None: rig.exited_at = now
+                elif now - rig.exited_at >= RIG_RESTART_DELAY:
+                    rig.restarts += 1
+                    self.launch(rig)
+            s = rig.frames
+            entry = {"name": rig.name, "status": status, "restarts": rig.restarts, "pid": int(s.stat("pid")),
+                     "frames": int(s.stat("frames")), "fps": round(s.stat("fps"), 1), "latency_ms": round(s.stat("latency_ms"), 2),
+                     "proc_ms": round(s.stat("proc_ms"), 2), "busy": round(s.stat("busy"), 2), "play_idx": int(s.stat("play_idx"))}
+            if rig.streamer is not None: entry["stream"] = {"port": rig.streamer.port, **rig.streamer.stats()}
+            report.append(entry)
+        return {"t": round(now - self.started, 1), "total_fps": round(sum(r["fps"] for r in report), 1), "rigs": report}
+
+    def close(self):
+        self.stop.set()
+        for rig in self.rigs:
+            rig.process.join(timeout=2.0)
+            if rig.process.is_alive(): rig.process.terminate(); rig.process.join()
+            if rig.streamer is not None: rig.streamer.close()
+            rig.frames.close(unlink=True)
+
+def load_rigs(path):
+    with open(path) as f: specs = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for i, spec in enumerate(specs):
+        spec.setdefault("name", f"rig{i}")
+        if isinstance(spec.get("camera"), str): spec["camera"] = os.path.join(base, spec["camera"])
+        if spec.get("replay"): spec["replay"] = os.path.join(base, spec["replay"])
+    return specs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="3dsc2 rigs", description="Run several camera + 3DS rigs, one worker process each")
+    parser.add_argument("config", help="JSON list of rigs (camera, mode, screens, ip, replay, ...)")
+    parser.add_argument("--stream", type=int, metavar="PORT", help="serve rig i as MJPEG on PORT + i")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between status lines")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--out", help="append the JSON status lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    try: specs = load_rigs(args.config)
+    except (OSError, ValueError) as e:
+        print(f"3dsc2: {e}", file=sys.stderr)
+        return 1
+    supervisor = RigSupervisor(specs, args.stream)
+    out = open(args.out, 'a') if args.out else sys.stdout
+    end = time.time() + args.duration if args.duration else None
+    try:
+        while end is None or time.time() < end:
+            time.sleep(args.interval)
+            out.write(json.dumps(supervisor.poll()) + "\n"); out.flush()
+    except KeyboardInterrupt: pass
+    finally:
+        supervisor.close()
+        if out is not sys.stdout: out.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
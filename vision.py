@@ -0,0 +1,571 @@
+import os
+import json
+import itertools
+import socket
+import select
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+CAMERA_SLOTS = 8 # camera indices checked for a device
+CAMERA_RESOLUTIONS = ((3840, 2160), (2560, 1440), (1920, 1080), (1280, 720), (640, 480))
+CAMERA_FOURCCS = ("MJPG", "YUYV")
+CAMERA_RATES = (60, 30)
+PROBE_FRAMES = 20 # frames timed per camera mode
+PROBE_TIMEOUT = 2.0 # give up timing a mode after this many seconds
+TOP_TARGET = (400, 240) 
+BOTTOM_TARGET = (320, 240)
+ROI_MARGIN = 4
+DETECT_WIDTH = 640 # full detection runs on a frame downscaled to this width
+TRACK_WIDTH = 320 # drift check thumbnail width
+DRIFT_IOU = 0.97 # re-detect once the bright-screen mask overlaps the reference less than this
+CORNER_SMOOTHING = 0.3 # fraction of the way to the latest detection moved per frame
+SNAP_PX = 80 # jumps larger than this (camera bumped) skip smoothing
+REBUILD_PX = 0.5 # rebuild the warp maps only when a corner moved at least this far
+SUPERSAMPLE_FACTORS = (1, 2, 3) # warp at N x N the target size, then area-average down
+DENOISE_ALPHA = 0.35 # weight of the new frame in the temporal average
+MOTION_THRESHOLD = 24.0 # per-pixel change treated as real motion, which resets the average there
+STACKED_SIZE = (400, 480) # top screen above a centered bottom screen, like the console
+VIDEO_FPS = 30.0
+VIDEO_QUEUE = 8
+STREAM_PORT = 8080
+STREAM_FPS = 30.0 # frames encoded per second for the HTTP stream, shared by every viewer
+STREAM_QUALITY = 80
+STREAM_SNDBUF = 64 * 1024 # small send buffer, so a slow viewer blocks its own thread (and skips) instead of queueing stale frames
+STREAM_NOTSENT_LOWAT = 16 * 1024 # a viewer's socket only counts as writable once less than this is still unsent
+STREAM_PAGE = (b"<!doctype html><title>3DSC2</title><body style='margin:0;background:#111'>"
+               b"<img src='/stream' style='height:100vh;display:block;margin:auto;image-rendering:pixelated'></body>")
+
+class FrameRing:
+    # Preallocated capture slots; the camera decodes into a free slot and consumers borrow the newest by index
+    def __init__(self, slots=4):
+        self.slots = [None] * slots
+        self.seqs = [0] * slots
+        self.stamps = [0.0] * slots
+        self.borrowed = [0] * slots
+        self.latest = -1
+        self.seq = 0
+        self.lock = threading.Condition()
+
+    def acquire(self):
+        with self.lock:
+            for i in range(1, len(self.slots) + 1):
+                idx = (self.latest + i) % len(self.slots)
+                if idx != self.latest and not self.borrowed[idx]: return idx
+        return None
+
+    def publish(self, idx, frame, stamp=None):
+        with self.lock:
+            self.slots[idx] = frame
+            self.seq += 1
+            self.seqs[idx] = self.seq
+            self.stamps[idx] = time.perf_counter() if stamp is None else stamp
+            self.latest = idx
+            self.lock.notify_all()
+            return self.seq
+
+    def has_newer(self, after_seq):
+        return self.latest >= 0 and self.seqs[self.latest] > after_seq
+
+    def borrow(self, after_seq=0):
+        with self.lock:
+            if not self.has_newer(after_seq): return None
+            idx = self.latest
+            self.borrowed[idx] += 1
+            return idx, self.seqs[idx], self.slots[idx], self.stamps[idx]
+
+    def wait(self, after_seq=0, timeout=None):
+        with self.lock:
+            self.lock.wait_for(lambda: self.has_newer(after_seq), timeout)
+            return self.borrow(after_seq)
+
+    def release(self, idx):
+        with self.lock: self.borrowed[idx] -= 1
+
+def layout_size(layout):
+    return {"stacked": STACKED_SIZE, "top": TOP_TARGET, "bottom": BOTTOM_TARGET}[layout]
+
+def compose_screens(warped, buf, layout):
+    top = warped[0] if len(warped) >= 1 else None
+    bottom = warped[1] if len(warped) >= 2 else None
+    if layout == "stacked":
+        th = TOP_TARGET[1]
+        if top is not None: buf[:th] = top
+        else: buf[:th] = 0
+        x = (buf.shape[1] - BOTTOM_TARGET[0]) // 2
+        if bottom is not None: buf[th:, x:x + BOTTOM_TARGET[0]] = bottom
+        else: buf[th:] = 0
+    else:
+        src = top if layout == "top" else bottom
+        if src is not None: buf[:] = src
+        else: buf[:] = 0
+
+class ScreenRecorder:
+    # Writes warped screens on its own thread; when the encoder falls behind, frames are dropped and counted
+    def __init__(self, path, layout="stacked", fps=VIDEO_FPS, queue_size=VIDEO_QUEUE, fourcc="mp4v"):
+        size = layout_size(layout)
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened(): raise OSError(f"Cannot open video writer for {path}")
+        self.layout = layout
+        w, h = size
+        self.free = queue.Queue()
+        for _ in range(queue_size): self.free.put(np.zeros((h, w, 3), dtype=np.uint8))
+        self.pending = queue.Queue()
+        # Capture timestamps per frame, on the same perf_counter clock as the event recording metadata
+        self.stamps = open(os.path.splitext(path)[0] + ".frames.csv", 'w')
+        self.stamps.write("frame,capture_perf_counter,capture_unix\n")
+        self.clock_offset = time.time() - time.perf_counter()
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, warped, stamp):
+        try: buf = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        self.compose(warped, buf)
+        self.pending.put((buf, stamp))
+
+    def compose(self, warped, buf):
+        compose_screens(warped, buf, self.layout)
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None: break
+            buf, stamp = item
+            self.writer.write(buf)
+            self.stamps.write(f"{self.written},{stamp:.6f},{stamp + self.clock_offset:.6f}\n")
+            self.written += 1
+            self.free.put(buf)
+        self.writer.release()
+        self.stamps.close()
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join(timeout=5.0)
+
+class FrameBroadcast:
+    # Latest encoded frame plus a sequence number; readers always get the newest, so slow ones just skip
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.data = None
+
+    def publish(self, data):
+        with self.cond:
+            self.data = data
+            self.seq += 1
+            self.cond.notify_all()
+
+    def wait(self, after_seq, timeout):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > after_seq, timeout): return None
+            return self.seq, self.data
+
+class ScreenStreamer:
+    # MJPEG over HTTP: /stream (multipart), /snapshot.jpg, and / (viewer page). Frames are JPEG-encoded
+    # once on the encoder thread and shared by every client thread through a FrameBroadcast
+    def __init__(self, host="0.0.0.0", port=STREAM_PORT, layout="stacked", fps=STREAM_FPS, quality=STREAM_QUALITY):
+        w, h = layout_size(layout)
+        self.layout = layout
+        self.interval = 1.0 / fps
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.free = [np.zeros((h, w, 3), dtype=np.uint8) for _ in range(2)]
+        self.pending = None
+        self.ready = threading.Condition()
+        self.broadcast = FrameBroadcast()
+        self.lock = threading.Lock()
+        self.last_submit = 0.0
+        self.encoded = 0
+        self.dropped = 0
+        self.clients = 0
+        self.served = 0
+        self.skipped = 0
+        self.running = True
+        from http.server import ThreadingHTTPServer # only paid for once a stream is started
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.encoder = threading.Thread(target=self.encode_loop, daemon=True)
+        self.encoder.start()
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True).start()
+
+    def submit(self, warped, stamp=None):
+        now = time.perf_counter()
+        if now - self.last_submit < self.interval: return
+        with self.ready:
+            if not self.free:
+                self.dropped += 1
+                return
+            buf = self.free.pop()
+        compose_screens(warped, buf, self.layout)
+        self.last_submit = now
+        with self.ready:
+            # Newest wins: a frame the encoder has not picked up yet is recycled
+            if self.pending is not None:
+                self.free.append(self.pending)
+                self.dropped += 1
+            self.pending = buf
+            self.ready.notify()
+
+    def encode_loop(self):
+        while True:
+            with self.ready:
+                self.ready.wait_for(lambda: self.pending is not None or not self.running)
+                if not self.running: return
+                buf, self.pending = self.pending, None
+            ok, jpeg = cv2.imencode(".jpg", buf, self.params)
+            with self.ready: self.free.append(buf)
+            if not ok: continue
+            self.broadcast.publish(jpeg.tobytes())
+            self.encoded += 1
+
+    def make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+        streamer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def send_body(self, content_type, body):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/": self.send_body("text/html", STREAM_PAGE)
+                elif path == "/snapshot.jpg":
+                    latest = streamer.broadcast.wait(0, 2.0)
+                    if latest is None: self.send_error(503, "No frame yet")
+                    else: self.send_body("image/jpeg", latest[1])
+                elif path == "/stream": self.stream()
+                else: self.send_error(404)
+
+            def stream(self):
+                sock = self.connection
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, STREAM_SNDBUF)
+                if hasattr(socket, "TCP_NOTSENT_LOWAT"): sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, STREAM_NOTSENT_LOWAT)
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                with streamer.lock: streamer.clients += 1
+                seq = sent = 0
+                try:
+                    while streamer.running:
+                        latest = streamer.broadcast.wait(seq, 1.0)
+                        if latest is None: continue
+                        seq, data = latest
+                        # Still sending earlier frames: queueing this one behind them would only add delay, so skip
+                        # it and send whatever is newest once the socket drains
+                        if not select.select([], [sock], [], 0)[1]: continue
+                        skipped = seq - sent - 1 if sent else 0
+                        sent = seq
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\nX-Frame: %d\r\n\r\n" % (len(data), seq))
+                        self.wfile.write(data)
+                        self.wfile.write(b"\r\n")
+                        with streamer.lock:
+                            streamer.served += 1
+                            streamer.skipped += skipped
+                except (BrokenPipeError, ConnectionResetError, TimeoutError): pass
+                finally:
+                    with streamer.lock: streamer.clients -= 1
+
+        return Handler
+
+    def stats(self):
+        return {"encoded": self.encoded, "dropped": self.dropped, "clients": self.clients,
+                "served": self.served, "skipped": self.skipped}
+
+    def close(self):
+        self.running = False
+        with self.ready: self.ready.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self.encoder.join(timeout=2.0)
+
+def order_corners(pts):
+    rect = np.zeros((4, 2), dtype="float32")
+    s = pts.sum(axis=1); rect[0] = pts[np.argmin(s)]; rect[2] = pts[np.argmax(s)]
+    diff = np.diff(pts, axis=1); rect[1] = pts[np.argmin(diff)]; rect[3] = pts[np.argmax(diff)]
+    return rect
+
+def roi_bbox(screens, margin=ROI_MARGIN):
+    pts = np.concatenate(screens)
+    x0, y0 = np.floor(pts.min(axis=0)).astype(int) - margin
+    x1, y1 = np.ceil(pts.max(axis=0)).astype(int) + margin + 1
+    return max(0, int(x0)), max(0, int(y0)), int(x1), int(y1)
+
+def distort_points(x, y, K, dist):
+    # Undistorted pixel coordinates -> camera pixel coordinates (OpenCV radial/tangential model)
+    k1, k2, p1, p2, k3 = (list(np.ravel(dist)) + [0.0] * 5)[:5]
+    fx, fy, cx, cy = K[0, 0], K[1, 1], K[0, 2], K[1, 2]
+    xn, yn = (x - cx) / fx, (y - cy) / fy
+    r2 = xn * xn + yn * yn
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+    xd = xn * radial + 2 * p1 * xn * yn + p2 * (r2 + 2 * xn * xn)
+    yd = yn * radial + p1 * (r2 + 2 * yn * yn) + 2 * p2 * xn * yn
+    return xd * fx + cx, yd * fy + cy
+
+class ScreenDetector:
+    # Finds the two lit screens as bright quadrilaterals and follows them with a cheap thumbnail check
+    def __init__(self):
+        self.reference = None
+        self.target = None
+        self.corners = None
+
+    def bright_mask(self, small):
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return mask
+
+    def detect(self, frame):
+        h, w = frame.shape[:2]
+        scale = DETECT_WIDTH / w
+        small = cv2.resize(frame, (DETECT_WIDTH, max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        mask = cv2.morphologyEx(self.bright_mask(small), cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        quads = []
+        for c in contours:
+            area = cv2.contourArea(c)
+            if area < 0.01 * mask.size: continue
+            hull = cv2.convexHull(c)
+            approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+            quad = approx.reshape(-1, 2) if len(approx) == 4 else cv2.boxPoints(cv2.minAreaRect(hull))
+            quads.append((area, quad.astype(np.float32) / scale))
+        if len(quads) < 2: return None
+        largest = [q for _, q in sorted(quads, key=lambda q: -q[0])[:2]]
+        top, bottom = sorted(largest, key=lambda q: q[:, 1].mean())
+        return [order_corners(top), order_corners(bottom)]
+
+    def drifted(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (TRACK_WIDTH, max(1, h * TRACK_WIDTH // w)), interpolation=cv2.INTER_NEAREST)
+        mask = self.bright_mask(small) > 0
+        if self.reference is not None:
+            iou = np.count_nonzero(mask & self.reference) / max(1, np.count_nonzero(mask | self.reference))
+            if iou >= DRIFT_IOU: return False
+        self.reference = mask
+        return True
+
+    def update(self, frame):
+        # Returns new corners when the warp should be rebuilt, otherwise None
+        if self.drifted(frame):
+            found = self.detect(frame)
+            if found is None: self.reference = None
+            else: self.target = found
+        if self.target is None: return None
+        if self.corners is None or max(np.abs(t - c).max() for t, c in zip(self.target, self.corners)) > SNAP_PX:
+            self.corners = [t.copy() for t in self.target]
+            return self.corners
+        step = [CORNER_SMOOTHING * (t - c) for t, c in zip(self.target, self.corners)]
+        if max(np.abs(d).max() for d in step) < REBUILD_PX: return None
+        self.corners = [c + d for c, d in zip(self.corners, step)]
+        return self.corners
+
+    def reset(self):
+        self.reference = self.target = self.corners = None
+
+class WarpEngine:
+    # ROI homographies (and lens undistortion, when calibrated) baked into fixed-point remap tables; rebuilt only when the ROIs change
+    def __init__(self, targets=(TOP_TARGET, BOTTOM_TARGET)):
+        self.targets = list(targets)
+        self.outputs = [np.zeros((h, w, 3), dtype=np.uint8) for w, h in self.targets]
+        self.homographies = []
+        self.plan = ([], [])
+        self.screens = []
+        self.supersample = 1
+        self.lens = None
+        self.lens_enabled = False
+        self.frame_size = None
+
+    def homography(self, pts, target_size):
+        w, h = target_size
+        dst = np.array([[0, 0], [w-1, 0], [w-1, h-1], [0, h-1]], dtype=np.float32)
+        return cv2.getPerspectiveTransform(order_corners(pts), dst)
+
+    def intrinsics(self):
+        # Calibrated intrinsics scaled to the current frame size, or None to warp without undistortion
+        if not self.lens_enabled or self.lens is None: return None
+        K, dist, (w, h) = self.lens
+        if self.frame_size and self.frame_size != (w, h):
+            sx, sy = self.frame_size[0] / w, self.frame_size[1] / h
+            K = np.diag([sx, sy, 1.0]) @ K
+        return K, dist
+
+    def build_maps(self, M, target_size, lens=None):
+        w, h = target_size
+        u, v = np.meshgrid(np.arange(w, dtype=np.float64), np.arange(h, dtype=np.float64))
+        inv = np.linalg.inv(M)
+        z = inv[2, 0] * u + inv[2, 1] * v + inv[2, 2]
+        map_x = (inv[0, 0] * u + inv[0, 1] * v + inv[0, 2]) / z
+        map_y = (inv[1, 0] * u + inv[1, 1] * v + inv[1, 2]) / z
+        if lens is not None: map_x, map_y = distort_points(map_x, map_y, *lens)
+        return map_x.astype(np.float32), map_y.astype(np.float32)
+
+    def set_screens(self, screens):
+        self.screens = list(screens)
+        lens = self.intrinsics()
+        n = self.supersample
+        sizes = [(w * n, h * n) for w, h in self.targets]
+        # With a lens model the homography lives in undistorted pixels; the maps distort back to camera pixels
+        ideal = [cv2.undistortPoints(pts.reshape(-1, 1, 2), *lens, P=lens[0]).reshape(-1, 2) if lens else pts for pts in screens]
+        homographies = [self.homography(pts, size) for pts, size in zip(ideal, sizes)]
+        maps = [cv2.convertMaps(*self.build_maps(M, size, lens), cv2.CV_16SC2) for M, size in zip(homographies, sizes)]
+        self.commit_plan(homographies, maps)
+
+    def commit_plan(self, homographies, maps):
+        # Supersampling warps into a larger scratch buffer, then averages n x n source samples per pixel
+        n = self.supersample
+        scratch = [np.zeros((h * n, w * n, 3), dtype=np.uint8) if n > 1 else None for w, h in self.targets[:len(maps)]]
+        # Swap in one assignment so a concurrent warp() never sees a half-built set
+        self.homographies = homographies
+        self.plan = (maps, scratch)
+
+    def plan_key(self):
+        # Everything the maps are built from; a cached plan is only reused when this matches exactly
+        lens = self.intrinsics()
+        return json.dumps({"screens": [np.asarray(pts).tolist() for pts in self.screens],
+                           "targets": self.targets, "supersample": self.supersample,
+                           "lens": [lens[0].tolist(), np.ravel(lens[1]).tolist()] if lens else None})
+
+    def save_plan(self, path):
+        maps, _ = self.plan
+        arrays = {f"map{i}_{j}": m for i, pair in enumerate(maps) for j, m in enumerate(pair)}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, key=np.array(self.plan_key()), homographies=np.array(self.homographies).reshape(-1, 3, 3), **arrays)
+        os.replace(tmp, path)
+
+    def load_plan(self, path, screens):
+        # Reuse last session's maps when nothing they depend on changed, otherwise build them as usual
+        self.screens = list(screens)
+        try:
+            with np.load(path) as data:
+                if str(data["key"]) != self.plan_key(): raise ValueError("stale plan")
+                homographies = list(data["homographies"])
+                maps = [(data[f"map{i}_0"], data[f"map{i}_1"]) for i in range(len(homographies))]
+        except (OSError, KeyError, ValueError):
+            self.set_screens(screens)
+            return False
+        self.commit_plan(homographies, maps)
+        return True
+
+    def set_lens(self, lens, enabled=True):
+        self.lens, self.lens_enabled = lens, enabled
+        self.set_screens(self.screens)
+
+    def fit_frame(self, size):
+        # Intrinsics follow the camera resolution; only matters (and only rebuilds) when undistorting
+        if size == self.frame_size: return
+        self.frame_size = size
+        if self.lens_enabled and self.lens is not None: self.set_screens(self.screens)
+
+    def set_supersample(self, n):
+        self.supersample = n
+        self.set_screens(self.screens)
+
+    def warp(self, frame):
+        # remap only reads the source pixels the maps point at, so the full frame costs no more than a crop of it
+        maps, scratch = self.plan
+        for i, (map1, map2) in enumerate(maps):
+            if scratch[i] is None:
+                self.outputs[i] = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=self.outputs[i])
+            else:
+                scratch[i] = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=scratch[i])
+                self.outputs[i] = cv2.resize(scratch[i], self.targets[i], dst=self.outputs[i], interpolation=cv2.INTER_AREA)
+        return self.outputs[:len(maps)]
+
+class TemporalDenoiser:
+    # Exponential moving average per pixel on the small warped screens; pixels that really changed restart from the new frame
+    def __init__(self, alpha=DENOISE_ALPHA, threshold=MOTION_THRESHOLD):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.acc = []
+        self.current = []
+        self.outputs = []
+
+    def apply(self, warped):
+        for i, img in enumerate(warped):
+            if i >= len(self.acc) or self.acc[i].shape != img.shape:
+                del self.acc[i:], self.current[i:], self.outputs[i:]
+                self.acc.append(img.astype(np.float32))
+                self.current.append(np.empty(img.shape, dtype=np.float32))
+                self.outputs.append(img.copy())
+                continue
+            acc, cur = self.acc[i], self.current[i]
+            np.copyto(cur, img)
+            # Still where every channel stays within the threshold; everything else is motion
+            t = self.threshold
+            motion = cv2.bitwise_not(cv2.inRange(cv2.absdiff(cur, acc), (0, 0, 0), (t, t, t)))
+            cv2.accumulateWeighted(cur, acc, self.alpha)
+            cv2.copyTo(cur, motion, acc)
+            self.outputs[i] = cv2.convertScaleAbs(acc, dst=self.outputs[i])
+        return self.outputs[:len(warped)]
+
+def fourcc_text(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ") or "?"
+
+def mode_text(mode):
+    w, h, fourcc, fps = mode
+    return f"{w}x{h} {fourcc or '?'} @{fps or '?'}"
+
+def list_cameras(slots=CAMERA_SLOTS, active=None):
+    found = []
+    for i in range(slots):
+        if i == active: found.append(i); continue # already open (or opening); a second open would fight over it
+        cap = cv2.VideoCapture(i)
+        try:
+            if cap.isOpened() and cap.read()[0]: found.append(i)
+        finally: cap.release()
+    return found
+
+def open_camera(index, mode):
+    cap = cv2.VideoCapture(index)
+    if not cap.isOpened(): return cap
+    w, h, fourcc, fps = mode
+    # Pixel format first: many UVC webcams only offer their larger sizes as MJPG and drop to YUYV at 5 fps otherwise
+    if fourcc and fourcc != "?": cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+    if fps: cap.set(cv2.CAP_PROP_FPS, fps)
+    return cap
+
+def camera_mode(cap):
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            fourcc_text(cap.get(cv2.CAP_PROP_FOURCC)), round(cap.get(cv2.CAP_PROP_FPS)))
+
+def probe_camera(index, roi_fraction, target_pixels, progress=None):
+    # Time every distinct mode the driver actually grants; score by screen pixels delivered per second,
+    # counting no more pixels per frame than the warped screens can use
+    results, seen = [], set()
+    for (w, h), fourcc, fps in itertools.product(CAMERA_RESOLUTIONS, CAMERA_FOURCCS, CAMERA_RATES):
+        request = (w, h, fourcc, fps)
+        cap = open_camera(index, request)
+        try:
+            if not cap.isOpened(): continue
+            mode = camera_mode(cap)
+            if mode in seen: continue
+            seen.add(mode)
+            if progress: progress(f"Probing {mode_text(mode)}...")
+            for _ in range(3): cap.read() # the first frames after a mode switch are often late
+            frames, t0 = 0, time.perf_counter()
+            while frames < PROBE_FRAMES and time.perf_counter() - t0 < PROBE_TIMEOUT:
+                if cap.read()[0]: frames += 1
+            elapsed = time.perf_counter() - t0
+        finally: cap.release()
+        measured = frames / elapsed if elapsed else 0.0
+        useful = min(mode[0] * mode[1] * roi_fraction, target_pixels)
+        results.append({"mode": mode, "request": request, "fps": round(measured, 1), "score": measured * useful})
+    results.sort(key=lambda r: (r["score"], r["fps"]), reverse=True)
+    return results